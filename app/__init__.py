@@ -1,9 +1,17 @@
-from flask import Flask, make_response, jsonify
+from flask import Flask, Response, abort, request
 from users.views import users as users_blueprint
 from authors.views import authors as authors_blueprint
 from organisms.views import organisms as organisms_blueprint
 from papers.views import papers as papers_blueprint
+from stats.views import stats as stats_blueprint
 from .auth import auth
+from .serialization import respond
+from . import cache
+from . import metrics
+from . import tracing
+from . import profiling
+from . import compression
+from . import backfill
 
 app = Flask(__name__)
 
@@ -11,23 +19,92 @@ app.register_blueprint(users_blueprint)
 app.register_blueprint(authors_blueprint)
 app.register_blueprint(organisms_blueprint)
 app.register_blueprint(papers_blueprint)
+app.register_blueprint(stats_blueprint)
+
+metrics.init_app(app)
+tracing.init_app(app)
+profiling.init_app(app)
+# Registered last so it runs first and the other hooks see encoded bodies.
+compression.init_app(app)
+
+
+@app.route('/_cache/stats', methods=['GET'])
+@auth.login_required
+def cache_stats():
+    return respond(cache.stats())
+
+
+@app.route('/_metrics', methods=['GET'])
+@auth.login_required
+def get_metrics():
+    return Response(metrics.registry.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/_traces/<trace_id>', methods=['GET'])
+@auth.login_required
+def get_trace(trace_id):
+    trace = tracing.get_trace(trace_id)
+    if trace is None:
+        abort(404)
+    return respond(trace)
+
+
+@app.route('/_profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    if not profiling.is_admin():
+        abort(403)
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        abort(404)
+    return respond(profile)
+
+
+@app.route('/_profiles/<profile_id>/pstats', methods=['GET'])
+def get_profile_dump(profile_id):
+    if not profiling.is_admin():
+        abort(403)
+    dump = profiling.get_profile_dump(profile_id)
+    if dump is None:
+        abort(404)
+    return Response(dump, mimetype='application/octet-stream')
+
+
+@app.route('/_backfill', methods=['POST'])
+def start_backfill():
+    if not profiling.is_admin():
+        abort(403)
+    kinds = request.args.getlist('kind') or None
+    if kinds is not None and not set(kinds) <= set(backfill.MODELS):
+        abort(400)
+    return respond({'queued': backfill.start(kinds)}, 202)
 
 
 @app.errorhandler(404)
 def not_found(error):
-    return make_response(jsonify({'error': 'Not Found'}), 404)
+    return respond({'error': 'Not Found'}, 404)
 
 
 @app.errorhandler(500)
 def internal_server_error(error):
-    return make_response(jsonify({'error': 'Internal Server Errror'}), 500)
+    return respond({'error': 'Internal Server Errror'}, 500)
 
 
 @app.errorhandler(400)
 def bad_request(error):
-    return make_response(jsonify({'error': 'Bad request'}), 400)
+    return respond({'error': 'Bad request'}, 400)
 
 
 @app.errorhandler(401)
 def unauthorized(error):
-    return make_response(jsonify({'error': 'Unauthorized'}), 401)
+    return respond({'error': 'Unauthorized'}, 401)
+
+
+@app.errorhandler(403)
+def forbidden(error):
+    return respond({'error': 'Forbidden'}, 403)
+
+
+@app.errorhandler(429)
+def too_many_requests(error):
+    return respond({'error': 'Too Many Requests'}, 429)
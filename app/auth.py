@@ -1,20 +1,121 @@
 from .models import User
+from .cache import LRUCache
+from .loader import get_loader
+from google.appengine.api import memcache
 from google.appengine.ext import ndb
-from flask_httpauth import HTTPBasicAuth
-from flask import g
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
+from flask import g, current_app
+from itsdangerous import (TimedJSONWebSignatureSerializer as Serializer,
+                          BadData)
+import hashlib
+import hmac
+import os
+import time
 
-auth = HTTPBasicAuth()
+CREDENTIALS_CACHE_SIZE = 1024
+CREDENTIALS_CACHE_TTL = 60
+TOKEN_EXPIRATION = 600
 
+basic_auth = HTTPBasicAuth()
+token_auth = HTTPTokenAuth('Bearer')
+auth = MultiAuth(basic_auth, token_auth)
 
-@auth.verify_password
+# Successful verifications, keyed by user id. Only a keyed digest of the
+# credentials is kept, never the password itself.
+_credentials = LRUCache(CREDENTIALS_CACHE_SIZE, CREDENTIALS_CACHE_TTL)
+_credentials_key = os.urandom(32)
+
+
+def _to_bytes(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def credentials_digest(username, password):
+    message = _to_bytes(username) + ':' + _to_bytes(password)
+    return hmac.new(_credentials_key, message, hashlib.sha256).digest()
+
+
+def forget_credentials(user_id):
+    _credentials.delete(_to_bytes(user_id))
+
+
+def clear_credentials_cache():
+    _credentials.clear()
+
+
+def _revocation_key(user_id):
+    return 'tokens-revoked:' + _to_bytes(user_id)
+
+
+def generate_token(user_id):
+    serializer = Serializer(current_app.config['SECRET_KEY'],
+                            expires_in=TOKEN_EXPIRATION)
+    return serializer.dumps({'id': user_id, 'issued': time.time()})
+
+
+# Revocations only need to outlive the tokens they cancel, so they are kept
+# in memcache for TOKEN_EXPIRATION seconds instead of in the datastore.
+def revoke_tokens(user_id):
+    memcache.set(_revocation_key(user_id), time.time(),
+                 time=TOKEN_EXPIRATION)
+
+
+def invalidate_user(user_id):
+    forget_credentials(user_id)
+    revoke_tokens(user_id)
+
+
+# The cache is per instance, so an entry is only trusted while no instance
+# has revoked the user since it was stored.
+def _cached_user(username, digest):
+    cached = _credentials.get(_to_bytes(username))
+    if cached is None or not hmac.compare_digest(cached[0], digest):
+        return None
+    digest, user, cached_at = cached
+    revoked = memcache.get(_revocation_key(username))
+    if revoked is not None and cached_at <= revoked:
+        forget_credentials(username)
+        return None
+    return user
+
+
+@basic_auth.verify_password
 def verify_password(username, password):
+    digest = credentials_digest(username, password)
+    user = _cached_user(username, digest)
+    if user is not None:
+        g.user = user
+        g.user_key = user.key
+        return True
+
+    cached_at = time.time()
     try:
-        user = ndb.Key('User', username).get()
+        user = get_loader().get(ndb.Key('User', username))
     except:
         return False
 
     if not user or not user.verify_password(password):
         return False
 
+    _credentials.set(_to_bytes(username), (digest, user, cached_at))
     g.user = user
+    g.user_key = user.key
+    return True
+
+
+@token_auth.verify_token
+def verify_token(token):
+    serializer = Serializer(current_app.config['SECRET_KEY'])
+    try:
+        data = serializer.loads(token)
+    except BadData:
+        return False
+
+    revoked = memcache.get(_revocation_key(data['id']))
+    if revoked is not None and data['issued'] <= revoked:
+        return False
+
+    g.user_key = ndb.Key('User', data['id'])
     return True
@@ -1,9 +1,20 @@
 from . import authors
-from ..models import User, Author
-from flask import make_response, request, jsonify, abort
+from ..models import User, Author, Paper
+from flask import request, abort
 from urllib import unquote_plus
 from google.appengine.ext import ndb
 from ..auth import auth
+from ..pagination import get_page, paginated_response, field_args
+from ..pagination import count_requested, count_response, page_args
+from ..cache import cached, invalidate
+from ..loader import get_loader
+from ..batch import batch_items, put_multi, created, batch_response, FAILED
+from ..batch import delete_existing, removed, NOT_FOUND
+from ..cascade import cascade, cascade_requested
+from ..streaming import stream_requested, stream_response
+from .. import counters
+from ..serialization import respond
+from collections import Counter
 import re
 
 
@@ -18,27 +29,37 @@ def check_all_elements(elements):
 
 def search_author(author_id):
     key = ndb.Key('Author', author_id)
-    return key.get()
+    return get_loader().get(key)
 
 
+@cached('Author', 'Organism')
 def get_author(author_id):
     author = search_author(author_id)
 
     if author is None:
         abort(404)
 
-    return make_response(jsonify(author.toJSON), 200)
+    return respond(author.serialize(field_args()))
 
 
 @auth.login_required
 def delete_author(author_id):
     key = ndb.Key('Author', author_id)
+    author = get_loader().get(key)
 
-    if key.get() is None:
+    if author is None:
         abort(404)
 
     key.delete()
-    return make_response(jsonify({'removed': author_id}), 200)
+    get_loader().forget(key)
+    counters.update(counters.deltas(
+        [counters.authors_by_organism(author.organism)], -1))
+    invalidate('Author')
+
+    result = {'removed': author_id}
+    if cascade_requested():
+        result['cascade'] = 'queued' if cascade([author]) else 'done'
+    return respond(result)
 
 
 @authors.route('/author/<author_id>', methods=['GET', 'DELETE'])
@@ -50,55 +71,166 @@ def handle_author(author_id):
         return delete_author(author_id)
 
 
+@authors.route('/author/suggest', methods=['GET'])
+@cached('Author')
+def suggest_authors():
+    limit, cursor = page_args()
+    try:
+        suggestions = Author.suggest(request.args.get('prefix'), limit)
+    except ValueError:
+        abort(400)
+    return respond(suggestions)
+
+
+@authors.route('/author/<author_id>/papers', methods=['GET'])
+@cached('Author', 'Paper')
+def get_author_papers(author_id):
+    key = ndb.Key('Author', unquote_plus(author_id).decode('utf-8'))
+
+    if get_loader().get(key) is None:
+        abort(404)
+
+    query = Paper.query(Paper.author == key)
+    if count_requested():
+        return count_response(query)
+    return paginated_response(*get_page(Paper, query))
+
+
 @authors.route('/author', methods=['POST', 'GET'])
 def handle_authors():
     if request.method == 'GET':
+        if stream_requested():
+            return stream_response(Author)
         return get_all_authors()
     if request.method == 'POST':
         return create_author()
 
+@cached('Author', 'Organism')
 def get_all_authors():
-    return make_response(jsonify(Author.getAll()), 200)
+    return paginated_response(*get_page(Author))
 
-@auth.login_required
-def create_author():
-    if not request.json or not request.json.get('id'):
-        abort(400)
+@ndb.tasklet
+def create_author_async(new_author):
+    loader = get_loader()
+    author, organism = yield (loader.load_async(new_author.key),
+                              loader.load_async(new_author.organism))
+    if author is not None or organism is None:
+        raise ndb.Return(None)
 
-    author_id = request.json.get('id')
-    if not verify_email(author_id):
-        abort(400)
+    author_key = yield new_author.put_async()
+    loader.prime(author_key, new_author)
+    counters.update_later(counters.deltas(
+        [counters.authors_by_organism(new_author.organism)], 1))
+    raise ndb.Return(author_key)
 
-    author = search_author(author_id)
-    if author is not None:
-        abort(400)
+def build_author(data):
+    if not isinstance(data, dict) or not data.get('id'):
+        return None
 
-    organism = request.json.get('organism')
+    author_id = data.get('id')
+    if not isinstance(author_id, basestring) or not verify_email(author_id):
+        return None
 
-    name = request.json.get('name')
-    last_name = request.json.get('lastName')
+    organism = data.get('organism')
 
-    if not check_all_elements([organism, name, last_name]):
-        abort(400)
+    name = data.get('name')
+    last_name = data.get('lastName')
 
-    organism_key = None
+    if not check_all_elements([organism, name, last_name]):
+        return None
 
     try:
         organism_key = ndb.Key(urlsafe=organism)
     except:
+        return None
+
+    return Author(id=author_id,
+                  organism=organism_key,
+                  name=name,
+                  last_name=last_name)
+
+@auth.login_required
+def create_author():
+    if not request.json:
         abort(400)
 
-    if organism_key.get() is None:
+    new_author = build_author(request.json)
+    if new_author is None:
         abort(400)
 
-    if verify_email(author_id) is False:
+    author_id = create_author_async(new_author).get_result()
+    if author_id is None:
         abort(400)
+    invalidate('Author')
 
-    new_author = Author(id=author_id,
-                        organism=organism_key,
-                        name=name,
-                        last_name=last_name)
+    return respond({'created': author_id.id()})
 
-    author_id = new_author.put()
+@authors.route('/author/batch', methods=['POST', 'DELETE'])
+def handle_authors_batch():
+    if request.method == 'POST':
+        return create_authors()
+    elif request.method == 'DELETE':
+        return delete_authors()
 
-    return make_response(jsonify({'created': author_id.id()}), 200)
+@auth.login_required
+def create_authors():
+    items = batch_items()
+    results = [FAILED] * len(items)
+
+    pending = []
+    seen = set()
+    for index, item in enumerate(items):
+        new_author = build_author(item)
+        if new_author is not None and new_author.key not in seen:
+            seen.add(new_author.key)
+            pending.append((index, new_author))
+
+    keys = set()
+    for index, new_author in pending:
+        keys.add(new_author.key)
+        keys.add(new_author.organism)
+    keys = list(keys)
+    loaded = dict(zip(keys, get_loader().get_multi(keys)))
+
+    pending = [(index, new_author) for index, new_author in pending
+               if loaded[new_author.key] is None and
+               loaded[new_author.organism] is not None]
+    author_keys = put_multi([new_author for index, new_author in pending])
+    for (index, new_author), author_key in zip(pending, author_keys):
+        results[index] = created(author_key.id())
+
+    if author_keys:
+        counters.update_later(Counter(
+            counters.authors_by_organism(new_author.organism)
+            for index, new_author in pending))
+        invalidate('Author')
+    return batch_response(results)
+
+@auth.login_required
+def delete_authors():
+    items = batch_items()
+    results = [NOT_FOUND] * len(items)
+
+    pending = []
+    for index, author_id in enumerate(items):
+        if isinstance(author_id, basestring) and author_id:
+            pending.append((index, ndb.Key('Author', author_id)))
+        else:
+            results[index] = FAILED
+
+    pending = delete_existing(pending)
+    for index, author in pending:
+        results[index] = removed(author.key.id())
+
+    if pending:
+        changes = Counter()
+        for index, author in pending:
+            changes[counters.authors_by_organism(author.organism)] -= 1
+        counters.update(changes)
+        invalidate('Author')
+        if cascade_requested():
+            deleted = [author for index, author in pending]
+            status = 'queued' if cascade(deleted) else 'done'
+            for index, author in pending:
+                results[index]['cascade'] = status
+    return batch_response(results)
@@ -0,0 +1,37 @@
+from .models import Author, Organism, Paper
+from .batch import BATCH_SIZE, put_multi
+from .cache import invalidate
+from . import search
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import deferred
+
+BACKFILL_QUEUE = 'default'
+MODELS = {'Paper': Paper, 'Author': Author, 'Organism': Organism}
+
+
+def start(kinds=None):
+    kinds = sorted(MODELS) if kinds is None else kinds
+    for kind in kinds:
+        deferred.defer(backfill, kind, _queue=BACKFILL_QUEUE)
+    return kinds
+
+
+# Papers are indexed without being put, which would move them to the end of
+# the changes feed; authors and organisms are put so that folded_name is
+# stored for the suggestion queries.
+def backfill(kind, cursor=None):
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    entities, next_cursor, more = MODELS[kind].query().fetch_page(
+        BATCH_SIZE, start_cursor=start_cursor)
+
+    if kind == 'Paper':
+        with search.batch():
+            for paper in entities:
+                search.index_paper(paper)
+    else:
+        put_multi(entities)
+    invalidate(kind)
+
+    if more and next_cursor is not None:
+        deferred.defer(backfill, kind, next_cursor.urlsafe(),
+                       _queue=BACKFILL_QUEUE)
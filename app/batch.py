@@ -0,0 +1,60 @@
+from flask import request, abort
+from .serialization import respond
+from google.appengine.ext import ndb
+from .loader import get_loader
+
+BATCH_SIZE = 500
+MAX_BATCH_ITEMS = 5000
+
+FAILED = {'status': 400, 'error': 'Bad request'}
+NOT_FOUND = {'status': 404, 'error': 'Not Found'}
+
+
+def batch_items():
+    items = request.json
+    if not isinstance(items, list) or not items:
+        abort(400)
+    if len(items) > MAX_BATCH_ITEMS:
+        abort(400)
+    return items
+
+
+def chunks(items, size=BATCH_SIZE):
+    for start in xrange(0, len(items), size):
+        yield items[start:start + size]
+
+
+def put_multi(entities):
+    futures = []
+    for chunk in chunks(entities):
+        futures.extend(ndb.put_multi_async(chunk))
+    return [future.get_result() for future in futures]
+
+
+def delete_multi(keys):
+    futures = []
+    for chunk in chunks(keys):
+        futures.extend(ndb.delete_multi_async(chunk))
+    ndb.Future.wait_all(futures)
+
+
+def delete_existing(pending):
+    entities = get_loader().get_multi([key for index, key in pending])
+    pending = [(index, entity) for (index, key), entity in zip(pending, entities)
+               if entity is not None]
+    delete_multi([entity.key for index, entity in pending])
+    for index, entity in pending:
+        get_loader().forget(entity.key)
+    return pending
+
+
+def created(entity_id):
+    return {'status': 200, 'created': entity_id}
+
+
+def removed(entity_id):
+    return {'status': 200, 'removed': entity_id}
+
+
+def batch_response(results):
+    return respond(results)
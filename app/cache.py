@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from functools import wraps
+from google.appengine.api import memcache
+from flask import request, make_response, Response
+from .serialization import negotiate
+import hashlib
+import threading
+import time
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.time():
+                return default
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + self.ttl)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+RESPONSE_CACHE_TTL = 3600
+MAX_CACHED_BODY = 900000
+
+
+def _generation_key(kind):
+    return 'generation:' + kind
+
+
+def _initial_generation():
+    # Generations restart from the clock so that a counter evicted from
+    # memcache never falls back to a value an older cached body was stored
+    # under.
+    return int(time.time() * 1000)
+
+
+def generations(kinds):
+    keys = [_generation_key(kind) for kind in kinds]
+    values = memcache.get_multi(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        initial = _initial_generation()
+        memcache.add_multi(dict((key, initial) for key in missing))
+        values.update(memcache.get_multi(missing))
+    return [values.get(key) for key in keys]
+
+
+def invalidate(*kinds):
+    if not kinds:
+        return
+    memcache.offset_multi(dict((_generation_key(kind), 1) for kind in kinds),
+                          initial_value=_initial_generation())
+    for kind in kinds:
+        if kind in _entity_caches:
+            _entity_caches[kind].clear()
+
+
+ENTITY_CACHE_SIZE = 1024
+ENTITY_CACHE_TTL = 600
+GENERATION_CHECK_INTERVAL = 10
+
+
+# Entities of a rarely written kind, kept in instance memory. Other instances
+# learn about writes through the kind's generation, which is read at most
+# once per GENERATION_CHECK_INTERVAL, so that is how stale a read can be.
+class EntityCache(object):
+
+    def __init__(self, kind, maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL,
+                 check_interval=GENERATION_CHECK_INTERVAL):
+        self.kind = kind
+        self.check_interval = check_interval
+        self._entities = LRUCache(maxsize, ttl)
+        self._generation = None
+        self._checked = 0
+
+    def _validate(self):
+        now = time.time()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        generation = generations([self.kind])[0]
+        if generation != self._generation:
+            self._entities.clear()
+            self._generation = generation
+
+    def get(self, key):
+        self._validate()
+        return self._entities.get(key)
+
+    def set(self, key, entity):
+        self._validate()
+        self._entities.set(key, entity)
+
+    def delete(self, key):
+        self._entities.delete(key)
+
+    def clear(self):
+        self._entities.clear()
+        self._checked = 0
+
+
+_entity_caches = {'Organism': EntityCache('Organism')}
+
+
+def entity_cache(kind):
+    return _entity_caches.get(kind)
+
+
+def clear_entity_caches():
+    for cache in _entity_caches.values():
+        cache.clear()
+
+
+def _count(name):
+    memcache.incr('response-cache:' + name, initial_value=0)
+
+
+def stats():
+    counters = memcache.get_multi(['hits', 'misses', 'not-modified'],
+                                  key_prefix='response-cache:')
+    return {'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'notModified': counters.get('not-modified', 0)}
+
+
+def not_modified(etag=None, last_modified=None):
+    response = Response(status=304)
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def cached(*kinds):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            current = generations(kinds)
+            if None in current:
+                return f(*args, **kwargs)
+
+            # The generations change whenever the body could, so the digest
+            # doubles as a strong ETag and is checked before anything is read.
+            # If-None-Match compares weakly, which also matches the weak tag
+            # compressed responses carry.
+            etag = hashlib.sha1(
+                repr((request.full_path, negotiate(), current))).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                _count('not-modified')
+                return not_modified(etag)
+
+            key = 'response:' + etag
+            entry = memcache.get(key)
+            if entry is not None:
+                _count('hits')
+                body, status, headers = entry
+                response = Response(body, status=status, headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response.make_conditional(request)
+
+            _count('misses')
+            response = make_response(f(*args, **kwargs))
+            response.headers['X-Cache'] = 'MISS'
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            response.set_etag(etag)
+            if len(response.get_data()) <= MAX_CACHED_BODY:
+                memcache.set(key, (response.get_data(),
+                                   response.status_code,
+                                   response.headers.to_wsgi_list()),
+                             time=RESPONSE_CACHE_TTL)
+            return response.make_conditional(request)
+        return decorated
+    return decorator
@@ -0,0 +1,139 @@
+from .models import Author, Paper
+from .batch import BATCH_SIZE
+from .cache import invalidate
+from . import counters
+from . import search
+from .changes import record_deletions, record_deletions_async
+from collections import Counter
+from flask import request
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import deferred
+from google.appengine.ext import ndb
+
+CASCADE_INLINE_LIMIT = 100
+CASCADE_QUEUE = 'default'
+
+
+def cascade_requested():
+    return request.args.get('cascade', '').lower() == 'true'
+
+
+# Papers are read as paper_type projections, which cost the same as a
+# keys-only query and carry what the counters need.
+def dependents_query(key):
+    if key.kind() == 'Author':
+        return (Paper.query(Paper.author == key),
+                {'projection': [Paper.paper_type]})
+    if key.kind() == 'Organism':
+        return Author.query(Author.organism == key), {'keys_only': True}
+    return None, None
+
+
+def dependent_kinds(kind):
+    if kind == 'Author':
+        return ('Paper',)
+    if kind == 'Organism':
+        return ('Author', 'Paper')
+    return ()
+
+
+def removed_dependents(parent_key, organism_key, results):
+    changes = Counter()
+    if parent_key.kind() == 'Author':
+        for paper in results:
+            changes.update(counters.deltas(counters.paper_counters(
+                parent_key, organism_key, paper.paper_type), -1))
+        return [paper.key for paper in results], changes
+    changes[counters.authors_by_organism(parent_key)] -= len(results)
+    return results, changes
+
+
+# The inline limit applies to the whole cascade: dependents are collected
+# level by level, and the walk stops as soon as the total passes the limit.
+@ndb.tasklet
+def collect_dependents_async(roots, limit):
+    found = []
+    level = roots
+    while level:
+        remaining = limit - sum(len(results) for _, _, results in found)
+        queries = []
+        for parent_key, organism_key in level:
+            query, options = dependents_query(parent_key)
+            if query is not None:
+                queries.append((parent_key, organism_key,
+                                query.fetch_async(remaining + 1, **options)))
+        level_results = yield [future for _, _, future in queries]
+
+        level = []
+        for (parent_key, organism_key, _), results in zip(queries,
+                                                          level_results):
+            found.append((parent_key, organism_key, results))
+            keys = removed_dependents(parent_key, organism_key, results)[0]
+            level.extend((key, organism_key) for key in keys)
+        if sum(len(results) for _, _, results in found) > limit:
+            raise ndb.Return(None)
+    raise ndb.Return(found)
+
+
+def delete_found(found):
+    keys, paper_keys, changes = [], [], Counter()
+    for parent_key, organism_key, results in found:
+        level_keys, level_changes = removed_dependents(parent_key,
+                                                       organism_key, results)
+        keys.extend(level_keys)
+        changes.update(level_changes)
+        if parent_key.kind() == 'Author':
+            paper_keys.extend(level_keys)
+
+    futures = ndb.delete_multi_async(keys)
+    futures.extend(record_deletions_async(paper_keys))
+    futures.append(counters.update_async(changes))
+    ndb.Future.wait_all(futures)
+    for future in futures:
+        future.check_success()
+
+
+def cascade(parents):
+    roots = []
+    for parent in parents:
+        if parent.key.kind() == 'Author':
+            roots.append((parent.key, parent.organism))
+        else:
+            roots.append((parent.key, parent.key))
+
+    found = collect_dependents_async(roots, CASCADE_INLINE_LIMIT).get_result()
+    if found is None:
+        for parent_key, organism_key in roots:
+            deferred.defer(delete_dependents, parent_key, organism_key,
+                           _queue=CASCADE_QUEUE)
+        return True
+
+    with search.batch():
+        delete_found(found)
+    invalidate(*set(kind for parent in parents
+                    for kind in dependent_kinds(parent.key.kind())))
+    return False
+
+
+def delete_dependents(parent_key, organism_key, cursor=None):
+    query, options = dependents_query(parent_key)
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    results, next_cursor, more = query.fetch_page(
+        BATCH_SIZE, start_cursor=start_cursor, **options)
+
+    keys, changes = removed_dependents(parent_key, organism_key, results)
+    for key in keys:
+        if dependents_query(key)[0] is not None:
+            deferred.defer(delete_dependents, key, organism_key,
+                           _queue=CASCADE_QUEUE)
+
+    with search.batch():
+        ndb.delete_multi(keys)
+    if parent_key.kind() == 'Author':
+        record_deletions(keys)
+    counters.update(changes)
+    invalidate(*dependent_kinds(parent_key.kind()))
+
+    if more and next_cursor is not None:
+        deferred.defer(delete_dependents, parent_key, organism_key,
+                       next_cursor.urlsafe(), _queue=CASCADE_QUEUE)
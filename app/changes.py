@@ -0,0 +1,84 @@
+from .models import Paper, PaperTombstone
+from .pagination import page_size
+from .batch import put_multi
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+from datetime import datetime
+import base64
+import calendar
+import json
+import math
+
+
+def tombstones(keys):
+    return [PaperTombstone(id=key.urlsafe()) for key in keys]
+
+
+def record_deletions(keys):
+    put_multi(tombstones(keys))
+
+
+def record_deletions_async(keys):
+    return ndb.put_multi_async(tombstones(keys))
+
+
+def to_timestamp(value):
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
+# A feed position is the `since` filter plus one datastore cursor per stream,
+# which keeps paging stable while papers keep being updated and deleted.
+def encode_position(since, papers_cursor, deleted_cursor):
+    position = [since, papers_cursor, deleted_cursor]
+    return base64.urlsafe_b64encode(json.dumps(position))
+
+
+def _since(value):
+    since = float(value)
+    if math.isinf(since) or math.isnan(since):
+        raise ValueError('since must be a finite timestamp')
+    return since
+
+
+def decode_position(value):
+    try:
+        return _since(value), None, None
+    except ValueError:
+        pass
+    since, papers_cursor, deleted_cursor = json.loads(
+        base64.urlsafe_b64decode(str(value)))
+    return _since(since), papers_cursor, deleted_cursor
+
+
+def _read(query, cursor, limit):
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    iterator = query.iter(limit=limit, start_cursor=start_cursor,
+                          produce_cursors=True)
+    return [(entity, iterator.cursor_after().urlsafe())
+            for entity in iterator]
+
+
+def changes_page(position=None, limit=None):
+    since, papers_cursor, deleted_cursor = (
+        decode_position(position) if position else (0.0, None, None))
+    start = datetime.utcfromtimestamp(since)
+    limit = page_size(limit)
+
+    papers = _read(Paper.query(Paper.updated >= start).order(Paper.updated),
+                   papers_cursor, limit)
+    deleted = _read(PaperTombstone.query(PaperTombstone.deleted >= start)
+                    .order(PaperTombstone.deleted),
+                    deleted_cursor, limit)
+
+    changes = sorted(
+        [(paper.updated, paper, cursor, None) for paper, cursor in papers] +
+        [(tombstone.deleted, tombstone, None, cursor)
+         for tombstone, cursor in deleted],
+        key=lambda change: change[0])[:limit]
+
+    for updated, entity, paper_cursor, tombstone_cursor in changes:
+        papers_cursor = paper_cursor or papers_cursor
+        deleted_cursor = tombstone_cursor or deleted_cursor
+
+    next_position = encode_position(since, papers_cursor, deleted_cursor)
+    return [change[1].toJSON for change in changes], next_position
@@ -0,0 +1,85 @@
+from flask import request, current_app
+import zlib
+
+COMPRESS_LEVEL = 6
+COMPRESS_MIN_SIZE = 500
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'text/plain',
+                      'text/html')
+WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def negotiate_encoding():
+    best, best_quality = None, 0
+    for encoding in ('gzip', 'deflate'):
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+# COMPRESS_LEVELS and COMPRESS_MIN_SIZES map endpoint names to overrides of
+# COMPRESS_LEVEL and COMPRESS_MIN_SIZE; a level of 0 turns compression off.
+def settings(endpoint):
+    config = current_app.config
+    level = config.get('COMPRESS_LEVELS', {}).get(
+        endpoint, config.get('COMPRESS_LEVEL', COMPRESS_LEVEL))
+    min_size = config.get('COMPRESS_MIN_SIZES', {}).get(
+        endpoint, config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE))
+    return level, min_size
+
+
+def compressor(encoding, level):
+    return zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+
+
+# Each chunk is flushed so clients keep receiving items as they are produced.
+def compress_stream(chunks, encoding, level):
+    stream = compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, unicode):
+                chunk = chunk.encode('utf-8')
+            yield stream.compress(chunk) + stream.flush(zlib.Z_SYNC_FLUSH)
+        yield stream.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    if (response.mimetype not in COMPRESSIBLE_TYPES or
+            response.status_code < 200 or
+            response.status_code in (204, 304) or
+            response.direct_passthrough or
+            'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    level, min_size = settings(request.endpoint)
+    if encoding is None or not level:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding,
+                                            level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        stream = compressor(encoding, level)
+        response.set_data(stream.compress(data) + stream.flush())
+
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is a different representation of the same resource,
+    # so its validator can only stay a weak one.
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,95 @@
+from collections import Counter
+from google.appengine.api import datastore_errors
+from google.appengine.ext import deferred
+from google.appengine.ext import ndb
+import random
+
+NUM_SHARDS = 20
+COUNTERS_QUEUE = 'default'
+
+
+class CounterShard(ndb.Model):
+    count = ndb.IntegerProperty(default=0, indexed=False)
+
+
+def papers_by_author(author_key):
+    return u'papers:author:' + author_key.id()
+
+
+def papers_by_organism(organism_key):
+    return u'papers:organism:' + organism_key.urlsafe()
+
+
+def papers_by_type(paper_type):
+    return u'papers:type:' + paper_type
+
+
+def authors_by_organism(organism_key):
+    return u'authors:organism:' + organism_key.urlsafe()
+
+
+def paper_counters(author_key, organism_key, paper_type):
+    names = [papers_by_author(author_key), papers_by_type(paper_type)]
+    if organism_key is not None:
+        names.append(papers_by_organism(organism_key))
+    return names
+
+
+def deltas(names, delta):
+    return Counter(dict((name, delta) for name in names))
+
+
+def _shard_keys(name):
+    return [ndb.Key(CounterShard, u'{}#{}'.format(name, index))
+            for index in range(NUM_SHARDS)]
+
+
+@ndb.transactional_tasklet
+def _increment_shard_async(key, delta):
+    shard = yield key.get_async()
+    if shard is None:
+        shard = CounterShard(key=key)
+    shard.count += delta
+    yield shard.put_async()
+
+
+def increment(name, delta):
+    _increment_shard_async(random.choice(_shard_keys(name)), delta).get_result()
+
+
+@ndb.tasklet
+def _increment_async(name, delta):
+    try:
+        yield _increment_shard_async(random.choice(_shard_keys(name)), delta)
+    except datastore_errors.TransactionFailedError:
+        deferred.defer(increment, name, delta)
+
+
+@ndb.tasklet
+def update_async(changes):
+    yield [_increment_async(name, delta)
+           for name, delta in changes.iteritems() if delta]
+
+
+def update(changes):
+    update_async(changes).get_result()
+
+
+# Creates hand their changes to a task, which keeps one transaction per
+# counter off the request path.
+def update_later(changes):
+    changes = Counter(dict((name, delta)
+                           for name, delta in changes.iteritems() if delta))
+    if changes:
+        deferred.defer(update, changes, _queue=COUNTERS_QUEUE)
+
+
+def get_counts(names):
+    keys = [_shard_keys(name) for name in names]
+    shards = ndb.get_multi([key for name_keys in keys for key in name_keys])
+    counts = {}
+    for index, name in enumerate(names):
+        name_shards = shards[index * NUM_SHARDS:(index + 1) * NUM_SHARDS]
+        counts[name] = sum(shard.count for shard in name_shards
+                           if shard is not None)
+    return counts
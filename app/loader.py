@@ -0,0 +1,68 @@
+from .cache import entity_cache
+from flask import g, has_app_context
+from google.appengine.ext import ndb
+
+
+# The entity is stored as soon as the lookup resolves; an ndb callback would
+# only run whenever the event loop next turns, possibly in a later request.
+@ndb.tasklet
+def _get_and_store_async(key, cache, options):
+    entity = yield key.get_async(**options)
+    if entity is not None:
+        cache.set(key, entity)
+    raise ndb.Return(entity)
+
+
+class Loader(object):
+
+    def __init__(self):
+        self._futures = {}
+
+    # Lookups started in the same tick are sent as a single Get RPC by the
+    # ndb autobatcher, so callers only need to start them before waiting.
+    def load_async(self, key, **options):
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+
+        cache = entity_cache(key.kind())
+        entity = cache.get(key) if cache is not None else None
+        if entity is not None:
+            self.prime(key, entity)
+            return self._futures[key]
+
+        if cache is not None:
+            future = _get_and_store_async(key, cache, options)
+        else:
+            future = key.get_async(**options)
+        self._futures[key] = future
+        return future
+
+    def load_multi_async(self, keys):
+        return [self.load_async(key) for key in keys]
+
+    def get(self, key, **options):
+        return self.load_async(key, **options).get_result()
+
+    def get_multi(self, keys):
+        return [future.get_result() for future in self.load_multi_async(keys)]
+
+    def prime(self, key, entity):
+        future = ndb.Future()
+        future.set_result(entity)
+        self._futures[key] = future
+
+    def forget(self, key):
+        self._futures.pop(key, None)
+        cache = entity_cache(key.kind())
+        if cache is not None:
+            cache.delete(key)
+
+
+def get_loader():
+    if not has_app_context():
+        return Loader()
+    loader = getattr(g, 'loader', None)
+    if loader is None:
+        loader = g.loader = Loader()
+    return loader
@@ -0,0 +1,154 @@
+from . import rpc
+from flask import g, request, has_request_context
+from google.appengine.api import quota
+import bisect
+import threading
+import time
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0)
+RPC_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+
+# name -> (help, buckets); metrics without buckets are counters.
+METRICS = {
+    'app_request_duration_seconds': ('Wall time per request.',
+                                     DURATION_BUCKETS),
+    'app_request_cpu_seconds': ('CPU time charged to the request.',
+                                DURATION_BUCKETS),
+    'app_request_rpcs': ('Datastore RPCs per request.', RPC_BUCKETS),
+    'app_rpc_duration_seconds': ('Latency of each datastore RPC.',
+                                 DURATION_BUCKETS),
+    'app_response_size_bytes': ('Size of buffered response bodies.',
+                                SIZE_BUCKETS),
+    'app_responses_total': ('Responses by status code.', None),
+}
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                buckets = METRICS[name][1]
+                series = Histogram(buckets) if buckets is not None else 0
+            if isinstance(series, Histogram):
+                series.observe(value)
+            else:
+                series += value
+            self._series[key] = series
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = []
+        for name in sorted(METRICS):
+            help_text, buckets = METRICS[name]
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(
+                name, 'histogram' if buckets is not None else 'counter'))
+            for (series_name, labels), value in series:
+                if series_name != name:
+                    continue
+                if buckets is None:
+                    lines.append(_sample(name, labels, value))
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value.counts):
+                    cumulative += count
+                    lines.append(_sample(name + '_bucket',
+                                         labels + (('le', str(bound)),),
+                                         cumulative))
+                lines.append(_sample(name + '_sum', labels, value.sum))
+                lines.append(_sample(name + '_count', labels, value.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return (unicode(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _sample(name, labels, value):
+    if not labels:
+        return u'{} {}'.format(name, value)
+    return u'{}{{{}}} {}'.format(
+        name, ','.join(u'{}="{}"'.format(label, _escape(label_value))
+                       for label, label_value in labels), value)
+
+
+registry = Registry()
+
+
+def _labels():
+    return {'endpoint': request.endpoint or 'unmatched',
+            'method': request.method}
+
+
+def _record_rpc(service, call, started, ended):
+    if service != 'datastore_v3' or not has_request_context():
+        return
+    if getattr(g, 'metrics_started', None) is None:
+        return
+    g.metrics_rpcs += 1
+    labels = _labels()
+    labels['call'] = call
+    registry.observe('app_rpc_duration_seconds', labels, ended - started)
+
+
+def start_request():
+    rpc.install()
+    g.metrics_rpcs = 0
+    g.metrics_cpu = quota.get_request_cpu_usage()
+    g.metrics_started = time.time()
+
+
+def finish_request(response):
+    started = getattr(g, 'metrics_started', None)
+    if started is None:
+        return response
+    labels = _labels()
+    registry.observe('app_request_duration_seconds', labels,
+                     time.time() - started)
+    # The runtime accounts CPU per request, unlike time.clock(), which counts
+    # every thread of the instance.
+    registry.observe('app_request_cpu_seconds', labels,
+                     quota.megacycles_to_cpu_seconds(
+                         quota.get_request_cpu_usage() - g.metrics_cpu))
+    registry.observe('app_request_rpcs', labels, g.metrics_rpcs)
+    if not response.is_streamed:
+        registry.observe('app_response_size_bytes', labels,
+                         response.calculate_content_length() or 0)
+    labels['status'] = str(response.status_code)
+    registry.observe('app_responses_total', labels)
+    return response
+
+
+def init_app(app):
+    rpc.listen(_record_rpc)
+    app.before_request(start_request)
+    app.after_request(finish_request)
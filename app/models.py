@@ -1,10 +1,133 @@
 from google.appengine.ext import ndb
 from google.appengine.ext.ndb import polymodel
 from passlib.apps import custom_app_context as pwd_context
+from .pagination import fetch_page, page_size
+from .loader import get_loader
+from . import search
+from .tracing import traced
+from datetime import datetime
 import re
 
+SUGGEST_LIMIT = 10
 
-class User(ndb.Model):
+
+def json_value(value):
+    if isinstance(value, ndb.Key):
+        return value.id()
+    if isinstance(value, datetime):
+        return str(value)
+    return value
+
+
+def folded(text):
+    return u' '.join(search.normalize(text or u''))
+
+
+class Paginated(object):
+    _references = ()
+    # JSON field -> property, for the fields a projection query can serve.
+    _projections = {}
+    # Projections backed by an index in index.yaml.
+    _projection_indexes = ()
+    _urlsafe_id = False
+    # Folded property and JSON fields served by prefix suggestions.
+    _suggest = None
+
+    @classmethod
+    def projectionFor(cls, fields):
+        if not fields:
+            return None
+        names = set()
+        for field in fields:
+            if field == 'id':
+                continue
+            if field not in cls._projections:
+                return None
+            names.add(cls._projections[field])
+        for projection in cls._projection_indexes:
+            if names <= set(projection):
+                return projection
+        return None
+
+    @classmethod
+    def resolve_references(cls, entities, fields=None):
+        names = [name for name in cls._references
+                 if fields is None or name in fields]
+        if not names:
+            return
+        keys = set()
+        for entity in entities:
+            for name in names:
+                key = getattr(entity, name)
+                if key is not None:
+                    keys.add(key)
+        ndb.Future.wait_all(get_loader().load_multi_async(list(keys)))
+
+    def reference(self, name):
+        return get_loader().get(getattr(self, name))
+
+    def jsonId(self):
+        return self.key.urlsafe() if self._urlsafe_id else self.key.id()
+
+    def serialize(self, fields=None):
+        if fields is None:
+            return self.toJSON
+        if self._projection:
+            data = {'id': self.jsonId()}
+            for field in fields:
+                if field in self._projections:
+                    value = getattr(self, self._projections[field])
+                    data[field] = json_value(value)
+            return data
+        data = self.toJSON
+        return dict((field, data[field]) for field in data
+                    if field == 'id' or field in fields)
+
+    @classmethod
+    def getPage(cls, limit=None, cursor=None, query=None, fields=None):
+        projection = None
+        if query is None:
+            query = cls.query()
+            projection = cls.projectionFor(fields)
+        entities, next_cursor = fetch_page(query, limit, cursor, projection)
+        if projection is None:
+            cls.resolve_references(entities, fields)
+        return [entity.serialize(fields) for entity in entities], next_cursor
+
+    @classmethod
+    def suggest(cls, prefix, limit=None):
+        prefix = folded(prefix)
+        if not prefix:
+            raise ValueError('Empty prefix')
+        name, fields = cls._suggest
+        prop = cls._properties[name]
+        query = cls.query(prop >= prefix, prop < prefix + u'\ufffd')
+        entities = query.order(prop).fetch(
+            page_size(limit, SUGGEST_LIMIT, SUGGEST_LIMIT),
+            projection=[cls._projections[field] for field in fields])
+        return [entity.serialize(fields) for entity in entities]
+
+    @classmethod
+    def iterPages(cls, batch_size, query=None, fields=None):
+        projection = None
+        if query is None:
+            query = cls.query()
+            projection = cls.projectionFor(fields)
+        future = query.fetch_page_async(batch_size, projection=projection)
+        while future is not None:
+            entities, cursor, more = future.get_result()
+            # Start reading the next batch while this one is serialized.
+            future = None
+            if more and cursor is not None:
+                future = query.fetch_page_async(batch_size,
+                                                start_cursor=cursor,
+                                                projection=projection)
+            if projection is None:
+                cls.resolve_references(entities, fields)
+            yield [entity.serialize(fields) for entity in entities]
+
+
+class User(Paginated, ndb.Model):
     nick = ndb.StringProperty(required=True)
     name = ndb.StringProperty(required=True)
     hashed_password = ndb.StringProperty()
@@ -13,6 +136,7 @@ class User(ndb.Model):
     def hash_password(self, password):
         self.hashed_password = pwd_context.encrypt(password)
 
+    @traced('User.verify_password')
     def verify_password(self, password):
         return pwd_context.verify(password, self.hashed_password)
 
@@ -23,24 +147,25 @@ class User(ndb.Model):
         return self.__repr__()
 
     @property
+    @traced('User.toJSON')
     def toJSON(self):
         return {"id": self.key.id(),
                 "nick": self.nick,
                 "name": self.name,
                 "lastName": self.last_name}
 
-    @classmethod
-    def getAll(self):
-        users = []
-        for user in User.query():
-            users.append(user.toJSON)
-        return users
-
 
-class Author(ndb.Model):
+class Author(Paginated, ndb.Model):
     organism = ndb.KeyProperty(kind='Organism', required=True)
     name = ndb.StringProperty(required=True)
     last_name = ndb.StringProperty(required=True)
+    folded_name = ndb.ComputedProperty(
+        lambda self: folded(u'{} {}'.format(self.name, self.last_name)))
+
+    _references = ('organism',)
+    _projections = {'name': 'name', 'lastName': 'last_name'}
+    _projection_indexes = (('name', 'last_name'),)
+    _suggest = ('folded_name', ('name', 'lastName'))
 
     def __repr__(self):
         return "Author: name: {}".format(self.name)
@@ -49,47 +174,68 @@ class Author(ndb.Model):
         return self.__repr__()
 
     @property
+    @traced('Author.toJSON')
     def toJSON(self):
+        # The organism is already gone while a queued cascade is still
+        # deleting its authors.
+        organism = self.reference('organism')
         return {"id": self.key.id(),
-                "organism": self.organism.get().toJSON,
+                "organism": organism.toJSON if organism is not None else None,
                 "name": self.name,
                 "lastName": self.last_name}
 
-    @classmethod
-    def getAll(self):
-        authors = []
-        for author in Author.query():
-            authors.append(author.toJSON)
-        return authors
-
 
-class Organism(ndb.Model):
+class Organism(Paginated, ndb.Model):
     name = ndb.StringProperty(repeated=False)
     address = ndb.StringProperty(required=True)
     country = ndb.StringProperty(required=True)
+    folded_name = ndb.ComputedProperty(lambda self: folded(self.name))
+
+    _projections = {'name': 'name', 'address': 'address',
+                    'country': 'country'}
+    _projection_indexes = (('name', 'country'),)
+    _urlsafe_id = True
+    _suggest = ('folded_name', ('name', 'country'))
+    # Organisms are shared through the entity cache, so their JSON is built
+    # once per entity.
+    _json = None
+
+    def _pre_put_hook(self):
+        self._json = None
 
     @property
+    @traced('Organism.toJSON')
     def toJSON(self):
-        return {"id": self.key.urlsafe(),
-                "name": self.name,
-                "address": self.address,
-                "country": self.country}
-
-    @classmethod
-    def getAll(self):
-        organisms = []
-        for organism in Organism.query():
-            organisms.append(organism.toJSON)
-        return organisms
+        if self._json is None:
+            self._json = {"id": self.key.urlsafe(),
+                          "name": self.name,
+                          "address": self.address,
+                          "country": self.country}
+        return dict(self._json)
 
 
-class Paper(polymodel.PolyModel):
+class Paper(Paginated, polymodel.PolyModel):
     author = ndb.KeyProperty(kind='Author', required=True)
     title = ndb.StringProperty(required=True)
     updated = ndb.DateTimeProperty(auto_now=True)
     paper_type = ndb.StringProperty(required=True)
 
+    _projections = {'title': 'title', 'author': 'author',
+                    'updated': 'updated', 'type': 'paper_type'}
+    _projection_indexes = (('paper_type', 'title'),)
+    _urlsafe_id = True
+
+    def _post_put_hook(self, future):
+        if future.get_exception() is None:
+            search.index_paper(self)
+
+    @classmethod
+    def _post_delete_hook(cls, key, future):
+        if future.get_exception() is None:
+            search.unindex_paper(key)
+
     @property
+    @traced('Paper.toJSON')
     def toJSON(self):
         return {"id": self.key.urlsafe(),
                 "title": self.title,
@@ -97,9 +243,13 @@ class Paper(polymodel.PolyModel):
                 "updated": str(self.updated),
                 "type": self.paper_type}
 
-    @classmethod
-    def getAll(self):
-        papers = []
-        for paper in Paper.query():
-            papers.append(paper.toJSON)
-        return papers
+
+class PaperTombstone(ndb.Model):
+    deleted = ndb.DateTimeProperty(auto_now=True)
+
+    @property
+    @traced('PaperTombstone.toJSON')
+    def toJSON(self):
+        return {"id": self.key.id(),
+                "updated": str(self.deleted),
+                "deleted": True}
@@ -1,9 +1,18 @@
 from . import organisms
-from ..models import Organism
-from flask import make_response, request, jsonify, abort
+from ..models import Organism, Author
+from flask import request, abort
 from urllib import unquote_plus
 from google.appengine.ext import ndb
 from ..auth import auth
+from ..pagination import get_page, paginated_response, field_args
+from ..pagination import count_requested, count_response, page_args
+from ..cache import cached, invalidate
+from ..loader import get_loader
+from ..batch import batch_items, put_multi, created, batch_response, FAILED
+from ..batch import delete_existing, removed, NOT_FOUND
+from ..cascade import cascade, cascade_requested
+from ..streaming import stream_requested, stream_response
+from ..serialization import respond
 import re
 
 
@@ -14,57 +23,161 @@ def check_all_elements(elements):
 @organisms.route('/organisms', methods=['POST', 'GET'])
 def handle_base_organism_endpoint():
     if request.method == 'GET':
+        if stream_requested():
+            return stream_response(Organism)
         return get_organisms()
     else:
         return put_organism()
 
 
+def build_organism(data):
+    if not isinstance(data, dict):
+        return None
+
+    name = data.get('name')
+    address = data.get('address')
+    country = data.get('country')
+
+    if check_all_elements([name, address, country]) is not True:
+        return None
+    return Organism(name=name,
+                    address=address,
+                    country=country)
+
+
 @auth.login_required
 def put_organism():
     if not request.json:
         abort(400)
 
-    name = request.json.get('name')
-    address = request.json.get('address')
-    country = request.json.get('country')
-
-    if check_all_elements([name, address, country]) is not True:
+    new_organism = build_organism(request.json)
+    if new_organism is None:
         abort(400)
-    new_organism = Organism(name=name,
-                            address=address,
-                            country=country)
 
     organism_id = new_organism.put()
+    invalidate('Organism')
 
-    return make_response(jsonify({'created': organism_id.urlsafe()}), 200)
+    return respond({'created': organism_id.urlsafe()})
 
 
+@cached('Organism')
 def get_organisms():
-    return make_response(jsonify(Organism.getAll()), 200)
+    return paginated_response(*get_page(Organism))
 
 
+@cached('Organism')
 def get_organism(id_organism):
     organism = None
     try:
-        organism = ndb.Key(urlsafe=id_organism).get()
+        organism = get_loader().get(ndb.Key(urlsafe=id_organism))
     except:
         abort(404)
     if organism is None:
         abort(404)
-    return make_response(jsonify(organism.toJSON), 200)
+    return respond(organism.serialize(field_args()))
 
 
 @auth.login_required
 def delete_organism(id_organism):
+    organism = None
+    try:
+        organism = get_loader().get(ndb.Key(urlsafe=id_organism))
+    except:
+        abort(404)
+    if organism is None:
+        abort(404)
+    organism.key.delete()
+    get_loader().forget(organism.key)
+    invalidate('Organism')
+
+    result = {'removed': organism.key.urlsafe()}
+    if cascade_requested():
+        result['cascade'] = 'queued' if cascade([organism]) else 'done'
+    return respond(result)
+
+
+@organisms.route('/organisms/batch', methods=['POST', 'DELETE'])
+def handle_organisms_batch():
+    if request.method == 'POST':
+        return put_organisms()
+    elif request.method == 'DELETE':
+        return delete_organisms()
+
+
+@auth.login_required
+def put_organisms():
+    items = batch_items()
+    results = [FAILED] * len(items)
+
+    pending = []
+    for index, item in enumerate(items):
+        new_organism = build_organism(item)
+        if new_organism is not None:
+            pending.append((index, new_organism))
+
+    organism_keys = put_multi([new_organism for index, new_organism in pending])
+    for (index, new_organism), organism_key in zip(pending, organism_keys):
+        results[index] = created(organism_key.urlsafe())
+
+    if organism_keys:
+        invalidate('Organism')
+    return batch_response(results)
+
+
+@auth.login_required
+def delete_organisms():
+    items = batch_items()
+    results = [NOT_FOUND] * len(items)
+
+    pending = []
+    for index, id_organism in enumerate(items):
+        try:
+            key = ndb.Key(urlsafe=id_organism)
+        except:
+            continue
+        if key.kind() == 'Organism':
+            pending.append((index, key))
+
+    pending = delete_existing(pending)
+    for index, organism in pending:
+        results[index] = removed(organism.key.urlsafe())
+
+    if pending:
+        invalidate('Organism')
+        if cascade_requested():
+            deleted = [organism for index, organism in pending]
+            status = 'queued' if cascade(deleted) else 'done'
+            for index, organism in pending:
+                results[index]['cascade'] = status
+    return batch_response(results)
+
+
+@organisms.route('/organisms/suggest', methods=['GET'])
+@cached('Organism')
+def suggest_organisms():
+    limit, cursor = page_args()
+    try:
+        suggestions = Organism.suggest(request.args.get('prefix'), limit)
+    except ValueError:
+        abort(400)
+    return respond(suggestions)
+
+
+@organisms.route('/organisms/<id_organism>/authors', methods=['GET'])
+@cached('Organism', 'Author')
+def get_organism_authors(id_organism):
     organism = None
     try:
         organism = ndb.Key(urlsafe=id_organism)
     except:
         abort(404)
-    if organism.get() is None:
+    if organism.kind() != 'Organism' or get_loader().get(organism) is None:
         abort(404)
-    organism.delete()
-    return make_response(jsonify({'removed': organism.urlsafe()}), 200)
+
+    query = Author.query(Author.organism == organism)
+    if count_requested():
+        return count_response(query)
+    return paginated_response(*get_page(Author, query))
 
 
 @organisms.route('/organisms/<id_organism>', methods=['GET', 'DELETE'])
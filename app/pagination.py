@@ -0,0 +1,68 @@
+from flask import request, abort
+from .serialization import respond
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.api import datastore_errors
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def page_size(limit, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if limit is None:
+        return default
+    return max(1, min(limit, maximum))
+
+
+def fetch_page(query, limit=None, cursor=None, projection=None):
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    entities, next_cursor, more = query.fetch_page(page_size(limit),
+                                                   start_cursor=start_cursor,
+                                                   projection=projection)
+    if not more or next_cursor is None:
+        return entities, None
+    return entities, next_cursor.urlsafe()
+
+
+def page_args():
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            abort(400)
+
+    return limit, cursor
+
+
+def field_args():
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+
+def get_page(model, query=None):
+    limit, cursor = page_args()
+    try:
+        return model.getPage(limit=limit, cursor=cursor, query=query,
+                             fields=field_args())
+    except (datastore_errors.BadValueError,
+            datastore_errors.BadRequestError):
+        abort(400)
+
+
+def count_requested():
+    return request.args.get('count', '').lower() == 'true'
+
+
+def count_response(query):
+    return respond({'count': query.count(keys_only=True)})
+
+
+def paginated_response(items, next_cursor):
+    response = respond(items)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
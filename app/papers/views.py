@@ -1,8 +1,21 @@
 from . import papers
 from ..models import Paper
 from ..auth import auth
-from flask import g, make_response, request, jsonify, abort
+from ..pagination import get_page, paginated_response, field_args
+from ..pagination import page_args, page_size
+from ..cache import cached, invalidate, not_modified
+from ..loader import get_loader
+from ..batch import batch_items, put_multi, created, batch_response, FAILED
+from ..batch import delete_existing, removed, NOT_FOUND
+from ..streaming import stream_requested, stream_response
+from .. import counters
+from .. import search
+from ..changes import changes_page, record_deletions
+from ..serialization import respond
+from collections import Counter
+from flask import g, request, abort
 from urllib import unquote_plus
+from google.appengine.api import datastore_errors
 from google.appengine.ext import ndb
 import re
 
@@ -11,66 +24,206 @@ def check_all_elements(elements):
     return all(elem is not None for elem in elements)
 
 
+def paper_changes(papers, authors, delta):
+    changes = Counter()
+    for paper in papers:
+        author = authors.get(paper.author)
+        organism = author.organism if author is not None else None
+        changes.update(counters.deltas(counters.paper_counters(
+            paper.author, organism, paper.paper_type), delta))
+    return changes
+
+
+def load_authors(papers):
+    author_keys = list(set(paper.author for paper in papers))
+    return dict(zip(author_keys, get_loader().get_multi(author_keys)))
+
+
+@ndb.tasklet
+def create_paper_async(new_paper):
+    loader = get_loader()
+    author = yield loader.load_async(new_paper.author)
+    if author is None:
+        raise ndb.Return(None)
+
+    paper_key = yield new_paper.put_async()
+    loader.prime(paper_key, new_paper)
+    counters.update_later(paper_changes([new_paper], {author.key: author}, 1))
+    raise ndb.Return(paper_key)
+
+
+def build_paper(data):
+    if not isinstance(data, dict):
+        return None
+    author_id = data.get('author')
+    title = data.get('title')
+    paper_type = data.get('type')
+
+    if check_all_elements([author_id, title, paper_type]) is not True:
+        return None
+
+    if paper_type not in ['congress', 'journal']:
+        return None
+
+    try:
+        return Paper(title=title,
+                     author=ndb.Key('Author', author_id),
+                     paper_type=paper_type)
+    except:
+        return None
+
+
 @auth.login_required
 def post_paper():
     if not request.json:
         abort(400)
-    author_id = request.json.get('author')
-    title = request.json.get('title')
-    paper_type = request.json.get('type')
-
-    if check_all_elements([author_id, title, paper_type]) is not True:
-        abort(400)
 
-    author = ndb.Key('Author', author_id)
-    if author.get() is None:
+    new_paper = build_paper(request.json)
+    if new_paper is None:
         abort(400)
 
-    if paper_type in ['congress', 'journal']:
-        new_paper = Paper(title=title,
-                          author=author,
-                          paper_type=paper_type)
-    else:
+    paper_id = create_paper_async(new_paper).get_result()
+    if paper_id is None:
         abort(400)
-
-    paper_id = new_paper.put()
-    return make_response(jsonify({'created': paper_id.urlsafe()}), 200)
+    invalidate('Paper')
+    return respond({'created': paper_id.urlsafe()})
 
 
+@cached('Paper')
 def get_paper(paper_id):
     try:
         paper_key = ndb.Key(urlsafe=paper_id)
     except:
         abort(404)
-    if paper_key.get() is None:
+    paper = get_loader().get(paper_key)
+    if paper is None:
         abort(404)
-    paper = paper_key.get()
-    return make_response(jsonify(paper.toJSON), 200)
+
+    # HTTP dates only carry whole seconds.
+    last_modified = paper.updated.replace(microsecond=0)
+    if (request.if_modified_since is not None and
+            last_modified <= request.if_modified_since):
+        return not_modified(last_modified=last_modified)
+
+    response = respond(paper.serialize(field_args()))
+    response.last_modified = last_modified
+    return response
 
 
 @auth.login_required
 def delete_paper(paper_id):
     paper = None
     try:
-        paper = ndb.Key(urlsafe=paper_id)
+        paper = get_loader().get(ndb.Key(urlsafe=paper_id))
     except:
         abort(404)
-    if paper.get() is None:
+    if paper is None:
         abort(404)
-    paper.delete()
-    return make_response(jsonify({'removed': paper.urlsafe()}), 200)
+    paper.key.delete()
+    get_loader().forget(paper.key)
+    record_deletions([paper.key])
+    counters.update(paper_changes([paper], load_authors([paper]), -1))
+    invalidate('Paper')
+    return respond({'removed': paper.key.urlsafe()})
 
 
 @papers.route('/papers/type/<paper_type>', methods=['GET'])
+@cached('Paper')
 def request_papers(paper_type):
     if paper_type not in ['congress', 'journal']:
         abort(400)
-    papers = Paper.getAll()
-    new_papers = []
-    for paper in papers:
-        if paper['type'] == paper_type:
-            new_papers.append(paper)
-    return make_response(jsonify(new_papers), 200)
+    query = Paper.query(Paper.paper_type == paper_type)
+    return paginated_response(*get_page(Paper, query))
+
+
+@papers.route('/papers/changes', methods=['GET'])
+def get_paper_changes():
+    limit, cursor = page_args()
+    position = request.args.get('since', cursor)
+    try:
+        return paginated_response(*changes_page(position, limit))
+    except (ValueError, TypeError, OverflowError,
+            datastore_errors.BadValueError, datastore_errors.BadRequestError):
+        abort(400)
+
+
+@papers.route('/papers/search', methods=['GET'])
+def search_papers():
+    limit, cursor = page_args()
+    text = request.args.get('q', '')
+    try:
+        paper_ids, next_cursor = search.search_papers(text, page_size(limit),
+                                                      cursor)
+    except (ValueError, search.Error):
+        abort(400)
+
+    keys = [ndb.Key(urlsafe=paper_id) for paper_id in paper_ids]
+    papers = [paper for paper in get_loader().get_multi(keys)
+              if paper is not None]
+    return paginated_response([paper.toJSON for paper in papers], next_cursor)
+
+
+@papers.route('/papers/batch', methods=['POST', 'DELETE'])
+def handle_papers_batch():
+    if request.method == 'POST':
+        return post_papers()
+    if request.method == 'DELETE':
+        return delete_papers()
+
+
+@auth.login_required
+def post_papers():
+    items = batch_items()
+    results = [FAILED] * len(items)
+
+    pending = []
+    for index, item in enumerate(items):
+        new_paper = build_paper(item)
+        if new_paper is not None:
+            pending.append((index, new_paper))
+
+    authors = load_authors([new_paper for index, new_paper in pending])
+
+    pending = [(index, new_paper) for index, new_paper in pending
+               if authors[new_paper.author] is not None]
+    with search.batch():
+        paper_keys = put_multi([new_paper for index, new_paper in pending])
+    for (index, new_paper), paper_key in zip(pending, paper_keys):
+        results[index] = created(paper_key.urlsafe())
+
+    if paper_keys:
+        counters.update_later(paper_changes(
+            [new_paper for index, new_paper in pending], authors, 1))
+        invalidate('Paper')
+    return batch_response(results)
+
+
+@auth.login_required
+def delete_papers():
+    items = batch_items()
+    results = [NOT_FOUND] * len(items)
+
+    pending = []
+    for index, paper_id in enumerate(items):
+        try:
+            key = ndb.Key(urlsafe=paper_id)
+        except:
+            continue
+        if key.kind() == 'Paper':
+            pending.append((index, key))
+
+    with search.batch():
+        pending = delete_existing(pending)
+    for index, paper in pending:
+        results[index] = removed(paper.key.urlsafe())
+
+    if pending:
+        deleted = [paper for index, paper in pending]
+        record_deletions([paper.key for paper in deleted])
+        counters.update(paper_changes(deleted, load_authors(deleted), -1))
+        invalidate('Paper')
+    return batch_response(results)
+
 
 @papers.route('/papers/<paper_id>', methods=['DELETE', 'GET'])
 def handle_papers(paper_id):
@@ -85,4 +238,11 @@ def get_or_post_papers():
     if request.method == 'POST':
         return post_paper()
     if request.method == 'GET':
-        return make_response(jsonify(Paper.getAll()), 200)
+        if stream_requested():
+            return stream_response(Paper)
+        return get_all_papers()
+
+
+@cached('Paper')
+def get_all_papers():
+    return paginated_response(*get_page(Paper))
@@ -0,0 +1,125 @@
+from .auth import auth
+from flask import g, request, current_app, abort
+from google.appengine.api import memcache
+import cProfile
+import marshal
+import os
+import pstats
+import threading
+import time
+import zlib
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TTL = 600
+PROFILE_TOP_N = 50
+# At most PROFILE_LIMIT profiled requests per PROFILE_WINDOW seconds across
+# all instances, and one at a time per instance.
+PROFILE_LIMIT = 5
+PROFILE_WINDOW = 60
+MAX_PROFILE_DUMP = 900000
+
+_running = threading.Lock()
+
+
+def profile_requested():
+    return (request.args.get('_profile') == '1' or
+            request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true'))
+
+
+def is_admin():
+    # login_required returns the 401 response instead of our True when the
+    # credentials are wrong.
+    if auth.login_required(lambda: True)() is not True:
+        return False
+    # OPTIONS requests pass login_required without credentials, so no user is
+    # set for them.
+    user_key = getattr(g, 'user_key', None)
+    if user_key is None:
+        return False
+    return user_key.id() in current_app.config.get('PROFILE_ADMINS', ())
+
+
+def _within_limit():
+    window = int(time.time() // PROFILE_WINDOW)
+    count = memcache.incr('profile-window:{}'.format(window), initial_value=0)
+    return count is not None and count <= PROFILE_LIMIT
+
+
+def _profile_key(profile_id):
+    return 'profile:' + profile_id
+
+
+def top_functions(stats, limit=PROFILE_TOP_N):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3],
+                  reverse=True)[:limit]
+    return [{'function': pstats.func_std_string(function),
+             'primitiveCalls': primitive_calls,
+             'calls': calls,
+             'totalTime': total_time,
+             'cumulativeTime': cumulative_time}
+            for function, (primitive_calls, calls, total_time,
+                           cumulative_time, callers) in rows]
+
+
+def get_profile(profile_id):
+    return memcache.get(_profile_key(profile_id))
+
+
+def get_profile_dump(profile_id):
+    dump = memcache.get(_profile_key(profile_id) + ':pstats')
+    if dump is None:
+        return None
+    return zlib.decompress(dump)
+
+
+def start_request():
+    if not profile_requested():
+        return
+    if not is_admin():
+        abort(403)
+    if not _running.acquire(False):
+        abort(429)
+    if not _within_limit():
+        _running.release()
+        abort(429)
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def finish_request(response):
+    profiler = getattr(g, 'profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    g.profiler = None
+    _running.release()
+
+    stats = pstats.Stats(profiler)
+    profile_id = os.urandom(8).encode('hex')
+    profile = {'path': request.full_path,
+               'method': request.method,
+               'status': response.status_code,
+               'totalTime': stats.total_tt,
+               'top': top_functions(stats)}
+    # pstats.Stats.dump_stats writes this same marshalled dict to a file.
+    dump = zlib.compress(marshal.dumps(stats.stats))
+    values = {_profile_key(profile_id): profile}
+    if len(dump) <= MAX_PROFILE_DUMP:
+        values[_profile_key(profile_id) + ':pstats'] = dump
+    memcache.set_multi(values, time=PROFILE_TTL)
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def teardown_request(exception):
+    profiler = getattr(g, 'profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        g.profiler = None
+        _running.release()
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(teardown_request)
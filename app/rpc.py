@@ -0,0 +1,30 @@
+from google.appengine.api import apiproxy_stub_map
+import time
+
+_listeners = []
+
+
+def listen(listener):
+    _listeners.append(listener)
+
+
+def _start(service, call, request, response, rpc):
+    if rpc is not None:
+        rpc.app_started = time.time()
+
+
+def _end(service, call, request, response, rpc):
+    started = getattr(rpc, 'app_started', None)
+    if started is None:
+        return
+    ended = time.time()
+    for listener in _listeners:
+        listener(service, call, started, ended)
+
+
+# The stub map is swapped when a testbed is activated, and Append ignores a
+# hook that is already registered, so this is safe to call on every request.
+def install():
+    apiproxy = apiproxy_stub_map.apiproxy
+    apiproxy.GetPreCallHooks().Append('app-rpc-start', _start)
+    apiproxy.GetPostCallHooks().Append('app-rpc-end', _end)
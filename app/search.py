@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+from google.appengine.api import search
+import re
+import threading
+import unicodedata
+
+INDEX_NAME = 'papers'
+# The Search API accepts at most this many documents per put or delete.
+MAX_DOCUMENTS = 200
+
+Error = search.Error
+
+_pending = threading.local()
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', unicode(text))
+    text = u''.join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r'\w+', text.lower(), re.UNICODE)
+
+
+def get_index():
+    return search.Index(name=INDEX_NAME)
+
+
+def paper_document(paper):
+    return search.Document(
+        doc_id=paper.key.urlsafe(),
+        fields=[search.TextField(name='title',
+                                 value=u' '.join(normalize(paper.title))),
+                search.AtomField(name='type', value=paper.paper_type),
+                search.AtomField(name='author', value=paper.author.id())])
+
+
+def _chunks(items):
+    for start in xrange(0, len(items), MAX_DOCUMENTS):
+        yield items[start:start + MAX_DOCUMENTS]
+
+
+def _flush(documents, doc_ids):
+    index = get_index()
+    for chunk in _chunks(documents):
+        index.put(chunk)
+    for chunk in _chunks(doc_ids):
+        index.delete(chunk)
+
+
+# Inside a batch, hooks queue their changes and the index is written once
+# per MAX_DOCUMENTS documents when the outermost batch exits.
+@contextmanager
+def batch():
+    if getattr(_pending, 'documents', None) is not None:
+        yield
+        return
+    _pending.documents, _pending.doc_ids = [], []
+    try:
+        yield
+    finally:
+        documents, doc_ids = _pending.documents, _pending.doc_ids
+        _pending.documents = _pending.doc_ids = None
+        _flush(documents, doc_ids)
+
+
+def index_paper(paper):
+    document = paper_document(paper)
+    if getattr(_pending, 'documents', None) is not None:
+        _pending.documents.append(document)
+    else:
+        _flush([document], [])
+
+
+def unindex_paper(key):
+    if getattr(_pending, 'doc_ids', None) is not None:
+        _pending.doc_ids.append(key.urlsafe())
+    else:
+        _flush([], [key.urlsafe()])
+
+
+def search_papers(text, limit, cursor=None):
+    terms = normalize(text)
+    if not terms:
+        raise ValueError('No search terms')
+
+    options = search.QueryOptions(
+        limit=limit,
+        cursor=search.Cursor(web_safe_string=cursor) if cursor
+        else search.Cursor(),
+        ids_only=True,
+        sort_options=search.SortOptions(match_scorer=search.MatchScorer()))
+    query = search.Query(
+        query_string=u' OR '.join(u'title:{}'.format(term) for term in terms),
+        options=options)
+    results = get_index().search(query)
+
+    next_cursor = None
+    if results.cursor is not None:
+        next_cursor = results.cursor.web_safe_string
+    return [document.doc_id for document in results.results], next_cursor
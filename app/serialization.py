@@ -0,0 +1,66 @@
+from flask import request, json, jsonify, current_app
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'json'
+COMPACT_JSON = 'compact-json'
+MSGPACK = 'msgpack'
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def compact_requested():
+    return request.args.get('compact', '').lower() == 'true'
+
+
+def negotiate():
+    if msgpack is not None:
+        best = request.accept_mimetypes.best_match((JSON_TYPE,) +
+                                                   MSGPACK_TYPES,
+                                                   default=JSON_TYPE)
+        if best in MSGPACK_TYPES:
+            return MSGPACK
+    if compact_requested():
+        return COMPACT_JSON
+    return JSON
+
+
+def mimetype(fmt):
+    return MSGPACK_TYPES[0] if fmt == MSGPACK else JSON_TYPE
+
+
+# Python 2 byte strings would be packed as msgpack bin, so keys, urlsafe ids
+# and formatted dates are turned into text like the unicode ndb values.
+def _text(data):
+    if isinstance(data, str):
+        return data.decode('utf-8')
+    if isinstance(data, dict):
+        return dict((_text(key), _text(value))
+                    for key, value in data.iteritems())
+    if isinstance(data, (list, tuple)):
+        return [_text(item) for item in data]
+    return data
+
+
+def dumps(data, fmt):
+    if fmt == MSGPACK:
+        return msgpack.packb(_text(data), use_bin_type=True)
+    if fmt == COMPACT_JSON:
+        return json.dumps(data, separators=(',', ':'))
+    return json.dumps(data)
+
+
+def respond(data, status=200):
+    fmt = negotiate()
+    if fmt == JSON:
+        response = jsonify(data)
+    else:
+        response = current_app.response_class(dumps(data, fmt),
+                                              mimetype=mimetype(fmt))
+    response.status_code = status
+    response.vary.add('Accept')
+    return response
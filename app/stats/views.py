@@ -0,0 +1,44 @@
+from . import stats
+from .. import counters
+from ..loader import get_loader
+from ..serialization import respond
+from flask import abort
+from urllib import unquote_plus
+from google.appengine.ext import ndb
+
+PAPER_TYPES = ['congress', 'journal']
+
+
+@stats.route('/stats', methods=['GET'])
+def get_stats():
+    names = [counters.papers_by_type(paper_type) for paper_type in PAPER_TYPES]
+    counts = counters.get_counts(names)
+    papers = dict((paper_type, counts[name])
+                  for paper_type, name in zip(PAPER_TYPES, names))
+    return respond({'papers': papers})
+
+
+@stats.route('/stats/author/<author_id>', methods=['GET'])
+def get_author_stats(author_id):
+    key = ndb.Key('Author', unquote_plus(author_id).decode('utf-8'))
+    if get_loader().get(key) is None:
+        abort(404)
+
+    name = counters.papers_by_author(key)
+    return respond({'papers': counters.get_counts([name])[name]})
+
+
+@stats.route('/stats/organisms/<id_organism>', methods=['GET'])
+def get_organism_stats(id_organism):
+    organism = None
+    try:
+        organism = ndb.Key(urlsafe=id_organism)
+    except:
+        abort(404)
+    if organism.kind() != 'Organism' or get_loader().get(organism) is None:
+        abort(404)
+
+    papers = counters.papers_by_organism(organism)
+    authors = counters.authors_by_organism(organism)
+    counts = counters.get_counts([papers, authors])
+    return respond({'papers': counts[papers], 'authors': counts[authors]})
@@ -0,0 +1,36 @@
+from flask import request, Response, stream_with_context
+from .pagination import field_args
+from .serialization import negotiate, dumps, mimetype, MSGPACK
+
+STREAM_BATCH_SIZE = 200
+
+
+def stream_requested():
+    return request.args.get('stream', '').lower() == 'true'
+
+
+# MessagePack has no way to open an array of unknown length, so a streamed
+# msgpack body is a sequence of one object per item instead.
+def stream_response(model, query=None):
+    fields = field_args()
+    fmt = negotiate()
+
+    def generate():
+        if fmt != MSGPACK:
+            yield '['
+        separator = ''
+        for items in model.iterPages(STREAM_BATCH_SIZE, query, fields):
+            if not items:
+                continue
+            if fmt == MSGPACK:
+                yield ''.join(dumps(item, fmt) for item in items)
+            else:
+                yield separator + ','.join(dumps(item, fmt) for item in items)
+                separator = ','
+        if fmt != MSGPACK:
+            yield ']'
+
+    response = Response(stream_with_context(generate()),
+                        mimetype=mimetype(fmt))
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,104 @@
+from . import rpc
+from functools import wraps
+from flask import g, request, has_request_context
+from google.appengine.api import memcache
+import os
+import time
+
+TRACE_HEADER = 'X-Trace'
+TRACE_TTL = 600
+
+# Chrome trace_event lanes: spans in the handler thread nest, while RPCs
+# overlap each other and get a lane of their own.
+VIEW_TID = 1
+RPC_TID = 2
+
+
+class Trace(object):
+
+    def __init__(self):
+        self.id = os.urandom(8).encode('hex')
+        self.started = time.time()
+        self.events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': VIEW_TID,
+             'args': {'name': 'view'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': RPC_TID,
+             'args': {'name': 'rpc'}},
+        ]
+
+    def _micros(self, value):
+        return int((value - self.started) * 1000000)
+
+    def add(self, name, category, started, ended, tid=VIEW_TID, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': 1,
+                 'tid': tid, 'ts': self._micros(started),
+                 'dur': self._micros(ended) - self._micros(started)}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def toJSON(self):
+        return {'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+
+
+def current_trace():
+    if not has_request_context():
+        return None
+    return getattr(g, 'trace', None)
+
+
+def traced(name):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            trace = current_trace()
+            if trace is None:
+                return f(*args, **kwargs)
+            started = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                trace.add(name, 'python', started, time.time())
+        return decorated
+    return decorator
+
+
+def _trace_key(trace_id):
+    return 'trace:' + trace_id
+
+
+def get_trace(trace_id):
+    return memcache.get(_trace_key(trace_id))
+
+
+def _record_rpc(service, call, started, ended):
+    trace = current_trace()
+    if trace is not None:
+        trace.add(call, service, started, ended, tid=RPC_TID)
+
+
+def start_request():
+    if request.headers.get(TRACE_HEADER, '').lower() not in ('1', 'true'):
+        return
+    rpc.install()
+    g.trace = Trace()
+
+
+def finish_request(response):
+    trace = current_trace()
+    if trace is None:
+        return response
+    g.trace = None
+    trace.add(request.endpoint or 'unmatched', 'view', trace.started,
+              time.time(), args={'method': request.method,
+                                 'path': request.full_path,
+                                 'status': response.status_code})
+    memcache.set(_trace_key(trace.id), trace.toJSON(), time=TRACE_TTL)
+    response.headers['X-Trace-Id'] = trace.id
+    return response
+
+
+def init_app(app):
+    rpc.listen(_record_rpc)
+    app.before_request(start_request)
+    app.after_request(finish_request)
@@ -1,7 +1,13 @@
 from . import users
 from ..models import User
-from ..auth import auth
-from flask import g, make_response, request, jsonify, abort
+from ..auth import auth, invalidate_user, verify_password, generate_token
+from ..auth import TOKEN_EXPIRATION
+from ..pagination import get_page, paginated_response, field_args
+from ..cache import cached, invalidate
+from ..loader import get_loader
+from ..streaming import stream_requested, stream_response
+from ..serialization import respond
+from flask import g, request, abort
 from urllib import unquote_plus
 from google.appengine.ext import ndb
 import re
@@ -15,7 +21,7 @@ def verify_email(email):
 
 def search_user(user_id):
     key = ndb.Key('User', user_id)
-    return key.get()
+    return get_loader().get(key)
 
 @auth.login_required
 def update_user(user_id):
@@ -25,7 +31,7 @@ def update_user(user_id):
         abort(400)
     elif user is None:
         abort(404)
-    elif user != g.user:
+    elif user.key != g.user_key:
         abort(401)
     nick = request.json.get('nick')
     name = request.json.get('name')
@@ -40,29 +46,35 @@ def update_user(user_id):
         user.nick = nick
 
     user.put()
+    invalidate_user(user_id)
+    invalidate('User')
 
-    return make_response(jsonify(user.toJSON), 200)
+    return respond(user.toJSON)
 
+@cached('User')
 def get_user(user_id):
     user = search_user(user_id)
 
     if user is None:
         abort(400)
 
-    return make_response(jsonify(user.toJSON), 200)
+    return respond(user.serialize(field_args()))
 
 @auth.login_required
 def delete_user(user_id):
     key = ndb.Key('User', user_id)
-    user = key.get()
+    user = get_loader().get(key)
 
     if user is None:
         abort(404)
-    elif user != g.user:
+    elif user.key != g.user_key:
         abort(401)
 
     key.delete()
-    return make_response(jsonify({'removed': user_id}), 200)
+    get_loader().forget(key)
+    invalidate_user(user_id)
+    invalidate('User')
+    return respond({'removed': user_id})
 
 @users.route('/user/check', methods=['POST'])
 def check_user():
@@ -76,17 +88,17 @@ def check_user():
         print "because not data"
         abort(400)
 
-    try:
-        user = ndb.Key('User', user_id).get()
-    except:
-        print "not key"
+    if (not isinstance(user_id, basestring) or
+            not isinstance(password, basestring)):
         abort(400)
 
-    if not user or not user.verify_password(password):
+    if not verify_password(user_id, password):
         print "not password"
         abort(400)
 
-    return make_response(jsonify({'user':'success'}), 200)
+    return respond({'user': 'success',
+                    'token': generate_token(user_id),
+                    'expiration': TOKEN_EXPIRATION})
 
 @users.route('/user/<user_id>', methods=['POST', 'GET', 'PUT', 'DELETE'])
 def user_treatment(user_id):
@@ -105,18 +117,35 @@ def get_users():
     if request.method == 'POST':
         return post_user()
     elif request.method == 'GET':
-        return make_response(jsonify(User.getAll()), 200)
+        if stream_requested():
+            return stream_response(User)
+        return get_all_users()
+
+@cached('User')
+def get_all_users():
+    return paginated_response(*get_page(User))
+
+@ndb.tasklet
+def create_user_async(new_user, password):
+    loader = get_loader()
+    existing = loader.load_async(new_user.key, use_memcache=False)
+    # Send the lookup now so that it is in flight while the password hashes.
+    ndb.get_context().flush()
+    new_user.hash_password(password)
+
+    user = yield existing
+    if user is not None:
+        raise ndb.Return(None)
 
+    user_key = yield new_user.put_async()
+    loader.prime(user_key, new_user)
+    raise ndb.Return(user_key)
 
 def post_user():
     if not request.json or not request.json.get('id'):
         abort(400)
 
     user_id = request.json.get('id')
-    user = search_user(user_id)
-
-    if user is not None:
-        abort(400)
 
     nick = request.json.get('nick')
     name = request.json.get('name')
@@ -137,7 +166,9 @@ def post_user():
                     last_name=last_name,
                     nick=nick)
 
-    new_user.hash_password(password)
-    user_id = new_user.put()
+    user_id = create_user_async(new_user, password).get_result()
+    if user_id is None:
+        abort(400)
+    invalidate('User')
 
-    return make_response(jsonify({'created':user_id.id()}), 200)
+    return respond({'created':user_id.id()})
@@ -0,0 +1,212 @@
+#!/usr/bin/python
+import json
+import math
+import optparse
+import os
+import site
+import sys
+import time
+
+USAGE = """%prog [options] SDK_PATH
+       %prog --compare BASELINE CURRENT
+Benchmark the API endpoints over the App Engine testbed stubs.
+SDK_PATH    Path to the SDK installation
+BASELINE    Results of a previous run, as written by --output
+CURRENT     Results to compare against BASELINE"""
+
+DEFAULT_SIZES = '1000'
+DEFAULT_ITERATIONS = 50
+PASSWORD = 'benchmark'
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered))) - 1
+    return ordered[max(rank, 0)]
+
+
+def summarize(latencies, rpcs, statuses, elapsed):
+    return {'requests': len(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean': sum(latencies) / len(latencies),
+            'throughput': len(latencies) / elapsed,
+            'rpcs': float(len(rpcs)) / len(latencies),
+            'rpcsByCall': dict((call, float(rpcs.count(call)) / len(latencies))
+                               for call in set(rpcs)),
+            'statuses': dict((str(status), statuses.count(status))
+                             for status in set(statuses))}
+
+
+def seed(size):
+    from google.appengine.ext import ndb
+    from app import search
+    from app.batch import put_multi
+    from app.models import User, Organism, Author, Paper
+
+    user = User(id='bench@bench.com', nick='bench', name='Bench',
+                last_name='Mark')
+    user.hash_password(PASSWORD)
+    user.put()
+
+    organisms = put_multi([Organism(name='Organism {}'.format(index),
+                                    address='Street {}'.format(index),
+                                    country='Spain')
+                           for index in xrange(max(size // 100, 1))])
+    authors = put_multi([Author(id='author{}@bench.com'.format(index),
+                                organism=organisms[index % len(organisms)],
+                                name='Name {}'.format(index),
+                                last_name='Last {}'.format(index))
+                         for index in xrange(max(size // 10, 1))])
+    with search.batch():
+        papers = put_multi([Paper(title='Paper {} about foo'.format(index),
+                                  author=authors[index % len(authors)],
+                                  paper_type=('journal', 'congress')[index % 2])
+                            for index in xrange(size)])
+    ndb.get_context().clear_cache()
+    return {'user': user.key.id(), 'organism': organisms[0].urlsafe(),
+            'author': authors[0].id(), 'paper': papers[0].urlsafe()}
+
+
+def endpoints(ids):
+    new_paper = json.dumps({'title': 'Benchmark', 'type': 'journal',
+                            'author': ids['author']})
+    return [
+        ('GET /papers', 'get', '/papers', None),
+        ('GET /papers?limit=100', 'get', '/papers?limit=100', None),
+        ('GET /papers?stream=true', 'get', '/papers?stream=true', None),
+        ('GET /papers/<id>', 'get', '/papers/' + ids['paper'], None),
+        ('GET /papers/type/journal', 'get', '/papers/type/journal', None),
+        ('GET /papers/search', 'get', '/papers/search?q=foo', None),
+        ('GET /author', 'get', '/author', None),
+        ('GET /author/<id>', 'get', '/author/' + ids['author'], None),
+        ('GET /author/<id>/papers', 'get',
+         '/author/{}/papers'.format(ids['author']), None),
+        ('GET /author/suggest', 'get', '/author/suggest?prefix=name+1', None),
+        ('GET /organisms', 'get', '/organisms', None),
+        ('GET /stats', 'get', '/stats', None),
+        ('POST /papers', 'post', '/papers', new_paper),
+    ]
+
+
+def run_endpoint(fixture, method, url, data, iterations, warm):
+    from google.appengine.api import memcache
+    from google.appengine.ext import ndb
+    from app.auth import clear_credentials_cache
+    from app.cache import clear_entity_caches
+    from tests.utils import build_auth_headers
+
+    headers = build_auth_headers('bench@bench.com', PASSWORD)
+    request = getattr(fixture.app, method)
+    latencies, rpcs, statuses = [], [], []
+    elapsed = 0.0
+    for _ in xrange(iterations):
+        if not warm:
+            memcache.flush_all()
+            clear_entity_caches()
+            clear_credentials_cache()
+        ndb.get_context().clear_cache()
+        fixture.rpcs.calls = []
+
+        start = time.time()
+        response = request(url, headers=headers, data=data,
+                           content_type='application/json')
+        response.get_data()
+        latency = time.time() - start
+
+        elapsed += latency
+        latencies.append(latency * 1000)
+        rpcs.extend(fixture.rpcs.calls)
+        statuses.append(response.status_code)
+    return summarize(latencies, rpcs, statuses, elapsed)
+
+
+def run(sizes, iterations, warm):
+    from tests.utils import BaseTestClass
+
+    class Fixture(BaseTestClass):
+
+        def runTest(self):
+            pass
+
+    results = {'iterations': iterations, 'warm': warm, 'sizes': {}}
+    for size in sizes:
+        fixture = Fixture()
+        fixture.setUp()
+        try:
+            ids = seed(size)
+            results['sizes'][str(size)] = dict(
+                (name, run_endpoint(fixture, method, url, data, iterations,
+                                    warm))
+                for name, method, url, data in endpoints(ids))
+        finally:
+            fixture.tearDown()
+    return results
+
+
+def change(baseline, current):
+    if not baseline:
+        return None
+    return round((current - baseline) * 100.0 / baseline, 1)
+
+
+def compare(baseline, current):
+    rows = []
+    for size in sorted(current['sizes'], key=int):
+        for name, stats in sorted(current['sizes'][size].items()):
+            before = baseline['sizes'].get(size, {}).get(name)
+            if before is None:
+                continue
+            rows.append({'size': int(size), 'endpoint': name,
+                         'p50': change(before['p50'], stats['p50']),
+                         'p95': change(before['p95'], stats['p95']),
+                         'p99': change(before['p99'], stats['p99']),
+                         'throughput': change(before['throughput'],
+                                              stats['throughput']),
+                         'rpcs': stats['rpcs'] - before['rpcs']})
+    return rows
+
+
+def main(sdk_path, sizes, iterations, warm):
+    sys.path.insert(0, sdk_path)
+    site.addsitedir(os.path.join(os.getcwd(), 'lib'))
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+    return run(sizes, iterations, warm)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option('--sizes', default=DEFAULT_SIZES,
+                      help='comma separated numbers of papers to seed')
+    parser.add_option('--iterations', type='int', default=DEFAULT_ITERATIONS,
+                      help='requests per endpoint')
+    parser.add_option('--warm', action='store_true', default=False,
+                      help='keep memcache and instance caches between requests')
+    parser.add_option('--output', help='write the results to this file')
+    parser.add_option('--compare', action='store_true', default=False,
+                      help='show the relative change between two runs')
+    options, args = parser.parse_args()
+
+    if options.compare:
+        if len(args) != 2:
+            print 'Error: Exactly 2 arguments required.'
+            parser.print_help()
+            sys.exit(1)
+        with open(args[0]) as baseline, open(args[1]) as current:
+            results = compare(json.load(baseline), json.load(current))
+    else:
+        if len(args) != 1:
+            print 'Error: Exactly 1 argument required.'
+            parser.print_help()
+            sys.exit(1)
+        sizes = [int(size) for size in options.sizes.split(',')]
+        results = main(args[0], sizes, options.iterations, options.warm)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output)
+    else:
+        print output
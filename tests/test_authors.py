@@ -8,6 +8,7 @@ from google.appengine.ext import ndb
 from google.appengine.ext import testbed
 
 from app import app
+from app.cache import clear_entity_caches
 from tests.utils import BaseTestClass, build_auth_headers
 
 
@@ -57,6 +58,27 @@ class TestAuthorBaseEndpoint(BaseTestClass):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(result, expected_result)
 
+    def testAuthorInsertedWithBatchedLookups(self):
+        self.rpcs.reset()
+        response = self.app.post('/author',
+                                 headers=self.headers,
+                                 data=json.dumps(self.fake_author),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rpcs.count('Get'), 1)
+        self.assertEqual(self.rpcs.count('Put'), 1)
+
+    def testAuthorAlreadyExists(self):
+        self.app.post('/author',
+                      headers=self.headers,
+                      data=json.dumps(self.fake_author),
+                      content_type='application/json')
+        response = self.app.post('/author',
+                                 headers=self.headers,
+                                 data=json.dumps(self.fake_author),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
     def testAuthorNotExistingOrganism(self):
         del self.fake_author['organism']
         response = self.app.post('/author',
@@ -90,6 +112,47 @@ class TestAuthorBaseEndpoint(BaseTestClass):
                                  content_type='application/json')
         self.assertEqual(response.status_code, 400)
 
+    def testAuthorBatchInsertion(self):
+        other_author = dict(self.fake_author, id='bar@foo.com')
+        wrong_organism = dict(self.fake_author, id='foo@foo.com',
+                              organism='fake')
+        authors = [self.fake_author, other_author, self.fake_author,
+                   wrong_organism]
+        response = self.app.post('/author/batch',
+                                 headers=self.headers,
+                                 data=json.dumps(authors),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual(result[0], {'status': 200,
+                                     'created': self.fake_author['id']})
+        self.assertEqual(result[1], {'status': 200,
+                                     'created': other_author['id']})
+        self.assertEqual([item['status'] for item in result[2:]], [400, 400])
+
+    def testGETAllAuthorsBatchesOrganisms(self):
+        response = self.app.post('/organisms',
+                                 data=json.dumps(self.organism),
+                                 headers=self.headers,
+                                 content_type='application/json')
+        other_organism_id = json.loads(response.data)['created']
+        for i in range(4):
+            author = dict(self.fake_author)
+            author['id'] = 'foo{}@foo.com'.format(i)
+            if i % 2:
+                author['organism'] = other_organism_id
+            self.app.post('/author',
+                          headers=self.headers,
+                          data=json.dumps(author),
+                          content_type='application/json')
+        self.rpcs.reset()
+        clear_entity_caches()
+        response = self.app.get('/author')
+        result = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(result), 4)
+        self.assertEqual(self.rpcs.count('Get'), 1)
+
     def get_all_authors(self):
         self.app.post('/author',
                       headers=self.headers,
@@ -150,6 +213,22 @@ class TestAuthorSpecificEndpoint(BaseTestClass):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(result, expected_result)
 
+    def testAuthorSuggestByPrefix(self):
+        response = self.app.get('/author/suggest?prefix=fo')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data),
+                         [{'id': self.fake_author['id'],
+                           'name': self.fake_author['name'],
+                           'lastName': self.fake_author['lastName']}])
+        response = self.app.get('/author/suggest?prefix=FOO+B')
+        self.assertEqual(len(json.loads(response.data)), 1)
+        response = self.app.get('/author/suggest?prefix=bar')
+        self.assertEqual(json.loads(response.data), [])
+
+    def testAuthorSuggestWithoutPrefix(self):
+        response = self.app.get('/author/suggest')
+        self.assertEqual(response.status_code, 400)
+
     def testAuthorGETRequestFalseAuthor(self):
         response = self.app.get('author/fakeuser')
         self.assertEqual(response.status_code, 404)
@@ -163,6 +242,59 @@ class TestAuthorSpecificEndpoint(BaseTestClass):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(result, expected_result)
 
+    def testAuthorDELETERequestCascade(self):
+        paper = {'title': 'The Lord of the Foos',
+                 'type': 'congress',
+                 'author': self.fake_author['id']}
+        for i in range(3):
+            self.app.post('/papers',
+                          headers=self.headers,
+                          data=json.dumps(paper),
+                          content_type='application/json')
+        quoted_url = quote_plus(self.fake_author['id'])
+        response = self.app.delete(
+            '/author/{}?cascade=true'.format(quoted_url), headers=self.headers)
+        result = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, {'removed': self.fake_author['id'],
+                                  'cascade': 'done'})
+        response = self.app.get('/papers')
+        self.assertEqual(json.loads(response.data), [])
+
+    def testAuthorPapersGETRequest(self):
+        paper = {'title': 'The Lord of the Foos',
+                 'type': 'congress',
+                 'author': self.fake_author['id']}
+        for i in range(2):
+            self.app.post('/papers',
+                          headers=self.headers,
+                          data=json.dumps(paper),
+                          content_type='application/json')
+        quoted_url = quote_plus(self.fake_author['id'])
+        response = self.app.get('/author/{}/papers'.format(quoted_url))
+        result = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(result), 2)
+        self.assertTrue(all(item['author'] == self.fake_author['id']
+                            for item in result))
+        response = self.app.get(
+            '/author/{}/papers?count=true'.format(quoted_url))
+        self.assertEqual(json.loads(response.data), {'count': 2})
+
+    def testAuthorPapersGETRequestNotExistentAuthor(self):
+        response = self.app.get('/author/fakeuser/papers')
+        self.assertEqual(response.status_code, 404)
+
+    def testAuthorBatchDELETERequest(self):
+        authors = [self.fake_author['id'], 'wrong!', 42]
+        response = self.app.delete('/author/batch',
+                                   headers=self.headers,
+                                   data=json.dumps(authors),
+                                   content_type='application/json')
+        result = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in result], [200, 404, 400])
+
     def testAuthorDELETERequestNotExistentUser(self):
         response = self.app.delete(
             '/author/{}'.format('wrong!'), headers=self.headers)
@@ -0,0 +1,90 @@
+import unittest
+import json
+
+from google.appengine.api import datastore
+from google.appengine.ext import ndb
+
+from app import app
+from app import search
+from app.models import Paper
+from tests.utils import BaseTestClass, build_auth_headers
+
+
+class TestBackfill(BaseTestClass):
+
+    def setUp(self):
+        super(TestBackfill, self).setUp()
+        self.user_info = {'id': 'foo@bar.com',
+                          'nick': 'foo',
+                          'name': 'Foo',
+                          'lastName': 'bar',
+                          'password': 'foobar'}
+        self.headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.post('/user',
+                      data=json.dumps(self.user_info),
+                      content_type='application/json')
+        app.config['PROFILE_ADMINS'] = [self.user_info['id']]
+
+        # Entities written before folded_name and the search index existed.
+        organism = datastore.Entity('Organism')
+        organism.update({'name': 'Foo', 'address': 'Foo Street',
+                         'country': 'Spain'})
+        self.organism_key = ndb.Key.from_old_key(datastore.Put(organism))
+        author = datastore.Entity('Author', name='foobar@foo.com')
+        author.update({'name': 'Foo', 'last_name': 'Bar',
+                       'organism': self.organism_key.to_old_key()})
+        datastore.Put(author)
+        paper = Paper(title='The Lord of the Foos', paper_type='journal',
+                      author=ndb.Key('Author', 'foobar@foo.com'))
+        self.paper_key = paper.put()
+        search.unindex_paper(self.paper_key)
+
+    def tearDown(self):
+        app.config.pop('PROFILE_ADMINS', None)
+        super(TestBackfill, self).tearDown()
+
+    def get_json(self, url):
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def testBackfillIndexesAndFoldsExistingEntities(self):
+        self.assertEqual(self.get_json('/papers/search?q=lord'), [])
+        self.assertEqual(self.get_json('/author/suggest?prefix=foo'), [])
+        self.assertEqual(self.get_json('/organisms/suggest?prefix=foo'), [])
+
+        updated = self.paper_key.get().updated
+        response = self.app.post('/_backfill', headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.data),
+                         {'queued': ['Author', 'Organism', 'Paper']})
+        self.run_deferred()
+
+        self.assertEqual([paper['id'] for paper in
+                          self.get_json('/papers/search?q=lord')],
+                         [self.paper_key.urlsafe()])
+        self.assertEqual(self.get_json('/author/suggest?prefix=foo'),
+                         [{'id': 'foobar@foo.com', 'name': 'Foo',
+                           'lastName': 'Bar'}])
+        self.assertEqual(self.get_json('/organisms/suggest?prefix=foo'),
+                         [{'id': self.organism_key.urlsafe(), 'name': 'Foo',
+                           'country': 'Spain'}])
+        self.assertEqual(self.paper_key.get(use_cache=False).updated,
+                         updated)
+
+    def testBackfillOneKind(self):
+        response = self.app.post('/_backfill?kind=Paper', headers=self.headers)
+        self.assertEqual(json.loads(response.data), {'queued': ['Paper']})
+        self.run_deferred()
+        self.assertEqual(len(self.get_json('/papers/search?q=lord')), 1)
+        self.assertEqual(self.get_json('/author/suggest?prefix=foo'), [])
+
+    def testBackfillUnknownKind(self):
+        response = self.app.post('/_backfill?kind=User', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def testBackfillRequiresAdmin(self):
+        app.config['PROFILE_ADMINS'] = []
+        response = self.app.post('/_backfill', headers=self.headers)
+        self.assertEqual(response.status_code, 403)
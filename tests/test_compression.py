@@ -0,0 +1,76 @@
+import json
+import zlib
+
+from app import app
+from tests.utils import BaseTestClass, build_auth_headers
+
+
+class TestCompression(BaseTestClass):
+
+    def setUp(self):
+        super(TestCompression, self).setUp()
+        self.user_info = {
+            'id': 'foo@bar.com',
+            'nick': 'foo',
+            'name': 'Foo',
+            'lastName': 'bar',
+            'password': 'foobar'
+        }
+        self.headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.post('/user',
+                      data=json.dumps(self.user_info),
+                      content_type='application/json')
+        self.organisms = [{'name': 'FOO {}'.format(index),
+                           'address': 'Foo Bar Street',
+                           'country': 'Spain'} for index in range(20)]
+        self.app.post('/organisms/batch',
+                      headers=self.headers,
+                      data=json.dumps(self.organisms),
+                      content_type='application/json')
+
+    def tearDown(self):
+        app.config.pop('COMPRESS_LEVELS', None)
+        super(TestCompression, self).tearDown()
+
+    def testGzipResponse(self):
+        response = self.app.get('/organisms',
+                                headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn('Accept-Encoding', response.headers.get('Vary'))
+        result = json.loads(zlib.decompress(response.data,
+                                            16 + zlib.MAX_WBITS))
+        self.assertEqual(len(result), len(self.organisms))
+
+    def testDeflateStreamedResponse(self):
+        response = self.app.get('/organisms?stream=true',
+                                headers={'Accept-Encoding': 'deflate'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'deflate')
+        result = json.loads(zlib.decompress(response.data))
+        self.assertEqual(len(result), len(self.organisms))
+
+    def testSmallResponseNotCompressed(self):
+        response = self.app.get('/stats', headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+
+    def testWithoutAcceptEncoding(self):
+        response = self.app.get('/organisms')
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual(len(json.loads(response.data)), len(self.organisms))
+
+    def testCompressionDisabledPerEndpoint(self):
+        app.config['COMPRESS_LEVELS'] = {
+            'organisms.handle_base_organism_endpoint': 0}
+        response = self.app.get('/organisms',
+                                headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+
+    def testConditionalRequestWithCompressedETag(self):
+        response = self.app.get('/organisms',
+                                headers={'Accept-Encoding': 'gzip'})
+        etag = response.headers.get('ETag')
+        self.assertTrue(etag.startswith('W/'))
+        response = self.app.get('/organisms',
+                                headers={'Accept-Encoding': 'gzip',
+                                         'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
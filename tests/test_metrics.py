@@ -0,0 +1,150 @@
+import json
+import marshal
+
+from app import app, metrics, profiling
+from tests.utils import BaseTestClass, build_auth_headers
+
+
+class TestMetricsEndpoint(BaseTestClass):
+
+    def setUp(self):
+        super(TestMetricsEndpoint, self).setUp()
+        metrics.registry.clear()
+        self.user_info = {
+            'id': 'foo@bar.com',
+            'nick': 'foo',
+            'name': 'Foo',
+            'lastName': 'bar',
+            'password': 'foobar'
+        }
+        self.headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.post('/user',
+                      data=json.dumps(self.user_info),
+                      content_type='application/json')
+
+    def testMetricsRecordRequests(self):
+        self.app.get('/organisms')
+        response = self.app.get('/_metrics', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        lines = response.data.splitlines()
+        self.assertIn('app_responses_total{endpoint="organisms.'
+                      'handle_base_organism_endpoint",method="GET",'
+                      'status="200"} 1', lines)
+        self.assertIn('app_request_duration_seconds_count{endpoint="organisms.'
+                      'handle_base_organism_endpoint",method="GET"} 1', lines)
+
+    def testMetricsRecordDatastoreRPCs(self):
+        self.rpcs.reset()
+        self.app.get('/user/foo@bar.com')
+        data = self.app.get('/_metrics', headers=self.headers).data
+        self.assertIn('app_rpc_duration_seconds_count{call="Get",', data)
+
+    def testMetricsRequireAuthentication(self):
+        response = self.app.get('/_metrics')
+        self.assertEqual(response.status_code, 401)
+
+
+class TestTracing(BaseTestClass):
+
+    def setUp(self):
+        super(TestTracing, self).setUp()
+        self.user_info = {
+            'id': 'foo@bar.com',
+            'nick': 'foo',
+            'name': 'Foo',
+            'lastName': 'bar',
+            'password': 'foobar'
+        }
+        self.headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.post('/user',
+                      data=json.dumps(self.user_info),
+                      content_type='application/json')
+
+    def testTracedRequest(self):
+        headers = dict(self.headers)
+        headers['X-Trace'] = '1'
+        response = self.app.post('/organisms',
+                                 headers=headers,
+                                 data=json.dumps({'name': 'FOO',
+                                                  'address': 'Foo Street',
+                                                  'country': 'Spain'}),
+                                 content_type='application/json')
+        trace_id = response.headers.get('X-Trace-Id')
+        self.assertTrue(trace_id)
+
+        response = self.app.get('/_traces/' + trace_id, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        events = json.loads(response.data)['traceEvents']
+        names = [event['name'] for event in events if event['ph'] == 'X']
+        self.assertIn('organisms.handle_base_organism_endpoint', names)
+        self.assertIn('User.verify_password', names)
+        self.assertIn('Put', names)
+
+    def testUntracedRequest(self):
+        response = self.app.get('/organisms')
+        self.assertIsNone(response.headers.get('X-Trace-Id'))
+
+    def testTraceNotFound(self):
+        response = self.app.get('/_traces/foo', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestProfiling(BaseTestClass):
+
+    def setUp(self):
+        super(TestProfiling, self).setUp()
+        self.user_info = {
+            'id': 'foo@bar.com',
+            'nick': 'foo',
+            'name': 'Foo',
+            'lastName': 'bar',
+            'password': 'foobar'
+        }
+        self.headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.post('/user',
+                      data=json.dumps(self.user_info),
+                      content_type='application/json')
+        app.config['PROFILE_ADMINS'] = [self.user_info['id']]
+
+    def tearDown(self):
+        app.config.pop('PROFILE_ADMINS', None)
+        super(TestProfiling, self).tearDown()
+
+    def testProfiledRequest(self):
+        response = self.app.get('/organisms?_profile=1', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers.get('X-Profile-Id')
+        self.assertTrue(profile_id)
+
+        response = self.app.get('/_profiles/' + profile_id,
+                                headers=self.headers)
+        profile = json.loads(response.data)
+        self.assertEqual(profile['path'], '/organisms?_profile=1')
+        self.assertTrue(profile['top'])
+
+        response = self.app.get('/_profiles/{}/pstats'.format(profile_id),
+                                headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(marshal.loads(response.data))
+
+    def testProfileRequiresAdmin(self):
+        app.config['PROFILE_ADMINS'] = []
+        response = self.app.get('/organisms?_profile=1', headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+        response = self.app.get('/organisms?_profile=1')
+        self.assertEqual(response.status_code, 403)
+
+    def testProfileOPTIONSRequest(self):
+        response = self.app.open('/organisms?_profile=1', method='OPTIONS')
+        self.assertEqual(response.status_code, 403)
+
+    def testProfileRateLimited(self):
+        statuses = [self.app.get('/organisms',
+                                 headers=dict(self.headers,
+                                              **{'X-Profile': '1'})).status_code
+                    for _ in range(profiling.PROFILE_LIMIT + 1)]
+        self.assertEqual(statuses[-1], 429)
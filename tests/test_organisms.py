@@ -8,6 +8,8 @@ from google.appengine.ext import ndb
 from google.appengine.ext import testbed
 
 from app import app
+from app import cascade
+from app.loader import Loader
 from tests.utils import BaseTestClass, build_auth_headers
 
 
@@ -52,6 +54,68 @@ class TestOrganismBaseEndpoint(BaseTestClass):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(result), 5)
 
+    def testGETRequestPaginated(self):
+        for i in range(5):
+            organism = {'name': 'FOO{}'.format(i),
+                        'address': 'Foo Bar Street',
+                        'country': 'Spain'}
+            self.app.post('/organisms',
+                          data=json.dumps(organism),
+                          headers=self.headers,
+                          content_type='application/json')
+        names = []
+        cursor = ''
+        while cursor is not None:
+            response = self.app.get(
+                '/organisms?limit=2&cursor={}'.format(cursor))
+            self.assertEqual(response.status_code, 200)
+            result = json.loads(response.data)
+            self.assertTrue(len(result) <= 2)
+            names.extend(organism['name'] for organism in result)
+            cursor = response.headers.get('X-Next-Cursor')
+        self.assertEqual(sorted(names),
+                         ['FOO{}'.format(i) for i in range(5)])
+
+    def testGETRequestStreamed(self):
+        for i in range(5):
+            organism = {'name': 'FOO{}'.format(i),
+                        'address': 'Foo Bar Street',
+                        'country': 'Spain'}
+            self.app.post('/organisms',
+                          data=json.dumps(organism),
+                          headers=self.headers,
+                          content_type='application/json')
+        response = self.app.get('/organisms?stream=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse('Content-Length' in response.headers)
+        result = json.loads(response.data)
+        self.assertEqual(sorted(organism['name'] for organism in result),
+                         ['FOO{}'.format(i) for i in range(5)])
+
+    def testGETRequestStreamedEmpty(self):
+        response = self.app.get('/organisms?stream=true')
+        self.assertEqual(json.loads(response.data), [])
+
+    def testGETRequestInvalidCursor(self):
+        response = self.app.get('/organisms?cursor=foo')
+        self.assertEqual(response.status_code, 400)
+
+    def testBatchPOSTRequest(self):
+        organisms = [{'name': 'FOO{}'.format(i),
+                      'address': 'Foo Bar Street',
+                      'country': 'Spain'} for i in range(3)]
+        organisms.append({'name': 'FOO'})
+        response = self.app.post('/organisms/batch',
+                                 data=json.dumps(organisms),
+                                 headers=self.headers,
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual([item['status'] for item in result],
+                         [200, 200, 200, 400])
+        response = self.app.get('/organisms')
+        self.assertEqual(len(json.loads(response.data)), 3)
+
     def testPOSTRequestNotEnoughInformation(self):
         organism = {'name': 'FOO',
                     'country': 'Spain'}
@@ -95,10 +159,66 @@ class TestOrganismSpecificEndpoint(BaseTestClass):
         self.organism['id'] = self.organism_id
         self.assertEqual(result, self.organism)
 
+    def testGETOrganismsSparseFields(self):
+        response = self.app.get('/organisms?fields=name,country')
+        result = json.loads(response.data)
+        self.assertEqual(result, [{'id': self.organism_id,
+                                   'name': self.organism['name'],
+                                   'country': self.organism['country']}])
+
+    def testGETOrganismSparseFields(self):
+        response = self.app.get(
+            '/organisms/{}?fields=address'.format(self.organism_id))
+        result = json.loads(response.data)
+        self.assertEqual(result, {'id': self.organism_id,
+                                  'address': self.organism['address']})
+
+    def testGETOrganismSuggestions(self):
+        response = self.app.get('/organisms/suggest?prefix=f')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data),
+                         [{'id': self.organism_id,
+                           'name': self.organism['name'],
+                           'country': self.organism['country']}])
+        response = self.app.get('/organisms/suggest?prefix=bar')
+        self.assertEqual(json.loads(response.data), [])
+
+    def testOrganismServedFromEntityCache(self):
+        key = ndb.Key(urlsafe=self.organism_id)
+        Loader().get(key)
+        self.rpcs.reset()
+        organism = Loader().get(key)
+        self.assertEqual(organism.name, self.organism['name'])
+        self.assertEqual(self.rpcs.count('Get'), 0)
+
+    def testEntityCacheClearedOnDelete(self):
+        key = ndb.Key(urlsafe=self.organism_id)
+        Loader().get(key)
+        self.app.delete('/organisms/{}'.format(self.organism_id),
+                        headers=self.headers)
+        self.assertIsNone(Loader().get(key))
+
     def testGETOrganismNotExistent(self):
         response = self.app.get('/organisms/{}'.format('false_organism'))
         self.assertEqual(response.status_code, 404)
 
+    def testGETOrganismAuthors(self):
+        author = {'id': 'foobar@foo.com',
+                  'name': 'Foo',
+                  'lastName': 'Bar',
+                  'organism': self.organism_id}
+        self.app.post('/author',
+                      headers=self.headers,
+                      data=json.dumps(author),
+                      content_type='application/json')
+        response = self.app.get('/organisms/{}/authors'.format(self.organism_id))
+        result = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in result], [author['id']])
+        response = self.app.get(
+            '/organisms/{}/authors?count=true'.format(self.organism_id))
+        self.assertEqual(json.loads(response.data), {'count': 1})
+
     def testDELETEOrganism(self):
         response = self.app.delete('organisms/{}'.format(self.organism_id),
                                    headers=self.headers)
@@ -106,6 +226,82 @@ class TestOrganismSpecificEndpoint(BaseTestClass):
         expected_result = {'removed': self.organism_id}
         self.assertEqual(result, expected_result)
 
+    def testDELETEOrganismCascade(self):
+        author = {'id': 'foobar@foo.com',
+                  'name': 'Foo',
+                  'lastName': 'Bar',
+                  'organism': self.organism_id}
+        self.app.post('/author',
+                      headers=self.headers,
+                      data=json.dumps(author),
+                      content_type='application/json')
+        response = self.app.delete(
+            'organisms/{}?cascade=true'.format(self.organism_id),
+            headers=self.headers)
+        result = json.loads(response.data)
+        self.assertEqual(result, {'removed': self.organism_id,
+                                  'cascade': 'done'})
+        response = self.app.get('/author')
+        self.assertEqual(json.loads(response.data), [])
+
+    def testBatchDELETEOrganisms(self):
+        response = self.app.delete('/organisms/batch',
+                                   data=json.dumps([self.organism_id, 'foo']),
+                                   headers=self.headers,
+                                   content_type='application/json')
+        result = json.loads(response.data)
+        self.assertEqual(result, [{'status': 200, 'removed': self.organism_id},
+                                  {'status': 404, 'error': 'Not Found'}])
+
+    def post_authors_with_papers(self, authors, papers):
+        for index in range(authors):
+            author_id = 'foo{}@foo.com'.format(index)
+            self.app.post('/author',
+                          headers=self.headers,
+                          data=json.dumps({'id': author_id,
+                                           'name': 'Foo',
+                                           'lastName': 'Bar',
+                                           'organism': self.organism_id}),
+                          content_type='application/json')
+            self.app.post('/papers/batch',
+                          headers=self.headers,
+                          data=json.dumps([{'title': 'Foo',
+                                            'type': 'journal',
+                                            'author': author_id}] * papers),
+                          content_type='application/json')
+
+    def testDELETEOrganismCascadeLimitCountsAllLevels(self):
+        # Each level stays under the limit, but the whole cascade does not.
+        self.post_authors_with_papers(2, cascade.CASCADE_INLINE_LIMIT // 2)
+        self.run_deferred()
+        response = self.app.delete(
+            'organisms/{}?cascade=true'.format(self.organism_id),
+            headers=self.headers)
+        self.assertEqual(json.loads(response.data)['cascade'], 'queued')
+        taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+        self.assertEqual(len(taskqueue.get_filtered_tasks()), 1)
+        response = self.app.get('/author')
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual(len(result), 2)
+        self.assertEqual([author['organism'] for author in result],
+                         [None, None])
+        self.run_deferred()
+        self.assertEqual(json.loads(self.app.get('/author').data), [])
+        self.assertEqual(json.loads(self.app.get('/papers').data), [])
+
+    def testBatchDELETEOrganismsCascade(self):
+        self.post_authors_with_papers(1, 1)
+        response = self.app.delete('/organisms/batch?cascade=true',
+                                   data=json.dumps([self.organism_id, 'foo']),
+                                   headers=self.headers,
+                                   content_type='application/json')
+        result = json.loads(response.data)
+        self.assertEqual(result, [{'status': 200, 'removed': self.organism_id,
+                                   'cascade': 'done'},
+                                  {'status': 404, 'error': 'Not Found'}])
+        self.assertEqual(json.loads(self.app.get('/author').data), [])
+
     def testDELETENotExistentOrganism(self):
         response = self.app.delete('organisms/{}'.format('foobar'),
                                    headers=self.headers)
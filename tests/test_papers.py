@@ -8,6 +8,8 @@ from google.appengine.ext import ndb
 from google.appengine.ext import testbed
 
 from app import app
+from app.cache import invalidate
+from app.pagination import MAX_PAGE_SIZE
 from tests.utils import BaseTestClass, build_auth_headers
 
 
@@ -98,6 +100,49 @@ class TestBasePaperEndpoint(TestPaperBaseClass):
                                  content_type='application/json')
         self.assertEqual(response.status_code, 400)
 
+    def testPaperBatchPOSTRequest(self):
+        wrong_author = dict(self.fake_paper_journal, author='fake')
+        wrong_type = dict(self.fake_paper_journal, type='foo')
+        papers = [self.fake_paper_congress, wrong_author,
+                  self.fake_paper_journal, wrong_type]
+        self.rpcs.reset()
+        response = self.app.post('/papers/batch',
+                                 headers=self.headers,
+                                 data=json.dumps(papers),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual([item['status'] for item in result],
+                         [200, 400, 200, 400])
+        self.assertTrue('created' in result[0])
+        self.assertEqual(self.rpcs.count('Get'), 1)
+        self.assertEqual(self.rpcs.count('Put'), 1)
+
+    def testPaperBatchPOSTRequestNotAList(self):
+        response = self.app.post('/papers/batch',
+                                 headers=self.headers,
+                                 data=json.dumps(self.fake_paper_congress),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def testPaperGETRequestLimitCapped(self):
+        self.app.post('/papers/batch',
+                      headers=self.headers,
+                      data=json.dumps([self.fake_paper_journal] *
+                                      (MAX_PAGE_SIZE + 1)),
+                      content_type='application/json')
+        response = self.app.get('/papers?limit={}'.format(MAX_PAGE_SIZE * 10))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data)), MAX_PAGE_SIZE)
+        cursor = response.headers.get('X-Next-Cursor')
+        self.assertTrue(cursor)
+        response = self.app.get('/papers?cursor=' + cursor)
+        self.assertEqual(len(json.loads(response.data)), 1)
+
+    def testPaperGETRequestInvalidCursor(self):
+        response = self.app.get('/papers?cursor=foo')
+        self.assertEqual(response.status_code, 400)
+
     def testPaperGETRequestCorrectly(self):
         response = self.app.post('/papers',
                                  headers=self.headers,
@@ -139,6 +184,19 @@ class TestSpecificPaperEndpoint(TestPaperBaseClass):
         del result['updated']
         self.assertEqual(result, self.fake_paper)
 
+    def testPaperGETRequestLoadsOnce(self):
+        self.rpcs.reset()
+        response = self.app.get('/papers/{}'.format(self.fake_paper['id']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rpcs.count('Get'), 1)
+
+    def testPaperGETRequestSparseFields(self):
+        response = self.app.get('/papers?fields=title,type')
+        result = json.loads(response.data)
+        self.assertEqual(result, [{'id': self.fake_paper['id'],
+                                   'title': self.fake_paper['title'],
+                                   'type': self.fake_paper['type']}])
+
     def testPaperDELETERequestCorrectly(self):
         response = self.app.delete('/papers/{}'.format(self.fake_paper['id']),
                                    headers=self.headers)
@@ -147,6 +205,58 @@ class TestSpecificPaperEndpoint(TestPaperBaseClass):
         expected_result = {'removed': self.fake_paper['id']}
         self.assertEqual(result, expected_result)
 
+    def testPaperGETRequestCached(self):
+        url = '/papers/{}'.format(self.fake_paper['id'])
+        response = self.app.get(url)
+        self.assertEqual(response.headers.get('X-Cache'), 'MISS')
+        self.rpcs.calls = []
+        response = self.app.get(url)
+        self.assertEqual(response.headers.get('X-Cache'), 'HIT')
+        self.assertEqual(self.rpcs.count(), 0)
+        result = json.loads(response.data)
+        del result['updated']
+        self.assertEqual(result, self.fake_paper)
+
+    def testPaperGETRequestNotModified(self):
+        url = '/papers/{}'.format(self.fake_paper['id'])
+        response = self.app.get(url)
+        etag = response.headers.get('ETag')
+        self.assertTrue(etag)
+        self.rpcs.calls = []
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, '')
+        self.assertEqual(self.rpcs.count(), 0)
+
+    def testPaperGETRequestModifiedSince(self):
+        url = '/papers/{}'.format(self.fake_paper['id'])
+        response = self.app.get(url)
+        last_modified = response.headers.get('Last-Modified')
+        self.assertTrue(last_modified)
+        invalidate('Paper')
+        response = self.app.get(url,
+                                headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, '')
+
+    def testPaperETagChangesOnWrite(self):
+        response = self.app.get('/papers')
+        etag = response.headers.get('ETag')
+        self.app.post('/papers',
+                      headers=self.headers,
+                      data=json.dumps(self.fake_paper),
+                      content_type='application/json')
+        response = self.app.get('/papers', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers.get('ETag'), etag)
+
+    def testPaperCacheInvalidatedOnDelete(self):
+        url = '/papers/{}'.format(self.fake_paper['id'])
+        self.app.get(url)
+        self.app.delete(url, headers=self.headers)
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 404)
+
     def testPaperDELETERequestWrongUser(self):
         fake_auth = build_auth_headers('fake', 'user')
         response = self.app.delete(
@@ -191,7 +301,133 @@ class TestPaperTypeEndpoint(TestPaperBaseClass):
         del result[0]['updated']
         self.assertEqual(result, [self.fake_paper_journal])
 
+    def testObtainPapersByTypePaginated(self):
+        self.app.post('/papers',
+                      headers=self.headers,
+                      data=json.dumps(self.fake_paper_congress),
+                      content_type='application/json')
+        response = self.app.get('/papers/type/congress?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data)), 1)
+        cursor = response.headers.get('X-Next-Cursor')
+        self.assertTrue(cursor is not None)
+        response = self.app.get(
+            '/papers/type/congress?limit=1&cursor={}'.format(cursor))
+        result = json.loads(response.data)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['type'], 'congress')
+
     def testObtainPapersInvalid(self):
         response = self.app.get('/papers/type/foo')
         self.assertEqual(response.status_code, 400)
 
+
+
+class TestPaperChangesEndpoint(TestPaperBaseClass):
+
+    def setUp(self):
+        super(TestPaperChangesEndpoint, self).setUp()
+        self.paper_ids = []
+        for title in ['The Lord of the Foos', 'The Lord of the Foos 2']:
+            response = self.app.post('/papers',
+                                     headers=self.headers,
+                                     data=json.dumps({
+                                         'title': title,
+                                         'type': 'journal',
+                                         'author': self.fake_author['id']}),
+                                     content_type='application/json')
+            self.paper_ids.append(json.loads(response.data)['created'])
+
+    def testChangesFromTheBeginning(self):
+        response = self.app.get('/papers/changes')
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual([paper['id'] for paper in result], self.paper_ids)
+
+        cursor = response.headers.get('X-Next-Cursor')
+        response = self.app.get('/papers/changes?since=' + cursor)
+        self.assertEqual(json.loads(response.data), [])
+
+    def testChangesPaginated(self):
+        response = self.app.get('/papers/changes?limit=1')
+        self.assertEqual([paper['id'] for paper in json.loads(response.data)],
+                         self.paper_ids[:1])
+        cursor = response.headers.get('X-Next-Cursor')
+        response = self.app.get('/papers/changes?limit=1&since=' + cursor)
+        self.assertEqual([paper['id'] for paper in json.loads(response.data)],
+                         self.paper_ids[1:])
+
+    def testChangesIncludeDeletions(self):
+        response = self.app.get('/papers/changes')
+        cursor = response.headers.get('X-Next-Cursor')
+        self.app.delete('/papers/' + self.paper_ids[0], headers=self.headers)
+
+        response = self.app.get('/papers/changes?since=' + cursor)
+        result = json.loads(response.data)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['id'], self.paper_ids[0])
+        self.assertTrue(result[0]['deleted'])
+
+    def testChangesSinceTimestampInTheFuture(self):
+        response = self.app.get('/papers/changes?since=99999999999')
+        self.assertEqual(json.loads(response.data), [])
+
+    def testChangesInvalidSince(self):
+        response = self.app.get('/papers/changes?since=foo')
+        self.assertEqual(response.status_code, 400)
+
+    def testChangesSinceOutOfRange(self):
+        for since in ['inf', '-inf', 'nan', '1e300']:
+            response = self.app.get('/papers/changes?since=' + since)
+            self.assertEqual(response.status_code, 400)
+
+
+class TestPaperSearchEndpoint(TestPaperBaseClass):
+
+    def setUp(self):
+        super(TestPaperSearchEndpoint, self).setUp()
+        papers = [{'title': u'The Lord of the Foos',
+                   'type': 'journal',
+                   'author': self.fake_author['id']},
+                  {'title': u'Foos and B\xe1rs',
+                   'type': 'congress',
+                   'author': self.fake_author['id']}]
+        response = self.app.post('/papers/batch',
+                                 headers=self.headers,
+                                 data=json.dumps(papers),
+                                 content_type='application/json')
+        self.paper_ids = [result['created']
+                          for result in json.loads(response.data)]
+
+    def search(self, url):
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [paper['id'] for paper in json.loads(response.data)]
+
+    def testSearchByTitleWord(self):
+        self.assertEqual(self.search('/papers/search?q=lord'),
+                         self.paper_ids[:1])
+
+    def testSearchIsNormalized(self):
+        self.assertEqual(self.search('/papers/search?q=BARS'),
+                         self.paper_ids[1:])
+
+    def testSearchMatchesAnyTerm(self):
+        self.assertEqual(sorted(self.search('/papers/search?q=lord+bars')),
+                         sorted(self.paper_ids))
+
+    def testSearchPaginated(self):
+        response = self.app.get('/papers/search?q=foos&limit=1')
+        first = [paper['id'] for paper in json.loads(response.data)]
+        cursor = response.headers.get('X-Next-Cursor')
+        self.assertTrue(cursor)
+        second = self.search('/papers/search?q=foos&limit=1&cursor=' + cursor)
+        self.assertEqual(sorted(first + second), sorted(self.paper_ids))
+
+    def testSearchDeletedPaper(self):
+        self.app.delete('/papers/' + self.paper_ids[0], headers=self.headers)
+        self.assertEqual(self.search('/papers/search?q=lord'), [])
+
+    def testSearchWithoutTerms(self):
+        response = self.app.get('/papers/search?q=')
+        self.assertEqual(response.status_code, 400)
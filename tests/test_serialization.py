@@ -0,0 +1,78 @@
+import json
+import unittest
+
+from app import serialization
+from tests.utils import BaseTestClass, build_auth_headers
+
+
+class TestSerialization(BaseTestClass):
+
+    def setUp(self):
+        super(TestSerialization, self).setUp()
+        self.user_info = {
+            'id': 'foo@bar.com',
+            'nick': 'foo',
+            'name': 'Foo',
+            'lastName': 'bar',
+            'password': 'foobar'
+        }
+        self.headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.post('/user',
+                      data=json.dumps(self.user_info),
+                      content_type='application/json')
+        self.organism = {'name': 'FOO',
+                         'address': 'Foo Bar Street',
+                         'country': 'Spain'}
+        response = self.app.post('/organisms',
+                                 data=json.dumps(self.organism),
+                                 headers=self.headers,
+                                 content_type='application/json')
+        self.organism['id'] = json.loads(response.data)['created']
+
+    def testCompactJSON(self):
+        response = self.app.get('/organisms?compact=true')
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertNotIn('\n', response.data)
+        self.assertNotIn(', ', response.data)
+        self.assertEqual(json.loads(response.data), [self.organism])
+
+    def testDefaultJSONVariesOnAccept(self):
+        response = self.app.get('/organisms')
+        self.assertEqual(json.loads(response.data), [self.organism])
+        self.assertIn('Accept', response.headers.get('Vary'))
+
+    @unittest.skipIf(serialization.msgpack is None, 'msgpack not installed')
+    def testMessagePack(self):
+        response = self.app.get('/organisms',
+                                headers={'Accept': 'application/msgpack'})
+        self.assertEqual(response.content_type, 'application/msgpack')
+        result = serialization.msgpack.unpackb(response.data,
+                                               encoding='utf-8')
+        self.assertEqual(result, [self.organism])
+        # Text must go out as msgpack str, which decodes to unicode, never
+        # as bin, which stays a byte string.
+        for key, value in result[0].items():
+            self.assertIsInstance(key, unicode)
+            self.assertIsInstance(value, unicode)
+
+    @unittest.skipIf(serialization.msgpack is None, 'msgpack not installed')
+    def testCachedPerFormat(self):
+        self.app.get('/organisms')
+        response = self.app.get('/organisms',
+                                headers={'Accept': 'application/msgpack'})
+        self.assertEqual(response.headers.get('X-Cache'), 'MISS')
+        self.assertEqual(response.content_type, 'application/msgpack')
+
+    @unittest.skipIf(serialization.msgpack is None, 'msgpack not installed')
+    def testStreamedMessagePack(self):
+        response = self.app.get('/organisms?stream=true',
+                                headers={'Accept': 'application/msgpack'})
+        unpacker = serialization.msgpack.Unpacker(encoding='utf-8')
+        unpacker.feed(response.data)
+        self.assertEqual(list(unpacker), [self.organism])
+
+    def testErrorsFollowNegotiatedFormat(self):
+        response = self.app.get('/organisms/foo?compact=true')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data, '{"error":"Not Found"}')
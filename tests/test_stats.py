@@ -0,0 +1,114 @@
+import unittest
+import json
+
+from app import app
+from app import counters
+from tests.utils import BaseTestClass, build_auth_headers
+
+
+class TestStatsEndpoint(BaseTestClass):
+
+    def setUp(self):
+        super(TestStatsEndpoint, self).setUp()
+        self.user_info = {
+            'id': 'foo@bar.com',
+            'nick': 'foo',
+            'name': 'Foo',
+            'lastName': 'bar',
+            'password': 'foobar'
+        }
+        self.headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.post('/user',
+                      data=json.dumps(self.user_info),
+                      content_type='application/json')
+
+        response = self.app.post('/organisms',
+                                 data=json.dumps({'name': 'FOO',
+                                                  'address': 'Foo Street',
+                                                  'country': 'Spain'}),
+                                 headers=self.headers,
+                                 content_type='application/json')
+        self.organism_id = json.loads(response.data)['created']
+        self.author_id = 'foobar@foo.com'
+        self.app.post('/author',
+                      headers=self.headers,
+                      data=json.dumps({'id': self.author_id,
+                                       'name': 'Foo',
+                                       'lastName': 'Bar',
+                                       'organism': self.organism_id}),
+                      content_type='application/json')
+
+    def post_paper(self, paper_type):
+        response = self.app.post('/papers',
+                                 headers=self.headers,
+                                 data=json.dumps({'title': 'Foo',
+                                                  'type': paper_type,
+                                                  'author': self.author_id}),
+                                 content_type='application/json')
+        return json.loads(response.data)['created']
+
+    def get_json(self, url):
+        self.run_deferred()
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def testGETStatsCountsPapersByType(self):
+        self.post_paper('congress')
+        self.post_paper('congress')
+        self.post_paper('journal')
+        self.assertEqual(self.get_json('/stats'),
+                         {'papers': {'congress': 2, 'journal': 1}})
+
+    def testGETAuthorAndOrganismStats(self):
+        self.post_paper('journal')
+        self.post_paper('congress')
+        self.assertEqual(self.get_json('/stats/author/' + self.author_id),
+                         {'papers': 2})
+        self.assertEqual(
+            self.get_json('/stats/organisms/' + self.organism_id),
+            {'papers': 2, 'authors': 1})
+
+    def testDELETEPaperDecrementsCounters(self):
+        paper_id = self.post_paper('journal')
+        self.post_paper('journal')
+        self.app.delete('/papers/' + paper_id, headers=self.headers)
+        self.assertEqual(self.get_json('/stats'),
+                         {'papers': {'congress': 0, 'journal': 1}})
+        self.assertEqual(self.get_json('/stats/author/' + self.author_id),
+                         {'papers': 1})
+
+    def testBatchPOSTPapersUpdatesCounters(self):
+        papers = [{'title': 'Foo', 'type': 'congress',
+                   'author': self.author_id}] * 3
+        self.app.post('/papers/batch',
+                      headers=self.headers,
+                      data=json.dumps(papers),
+                      content_type='application/json')
+        self.assertEqual(
+            self.get_json('/stats/organisms/' + self.organism_id),
+            {'papers': 3, 'authors': 1})
+
+    def testDELETEAuthorCascadeDecrementsCounters(self):
+        self.post_paper('congress')
+        self.post_paper('journal')
+        self.app.delete('/author/{}?cascade=true'.format(self.author_id),
+                        headers=self.headers)
+        self.assertEqual(self.get_json('/stats'),
+                         {'papers': {'congress': 0, 'journal': 0}})
+        self.assertEqual(
+            self.get_json('/stats/organisms/' + self.organism_id),
+            {'papers': 0, 'authors': 0})
+
+    def testCountersSpreadOverShards(self):
+        name = counters.papers_by_type('journal')
+        for _ in range(50):
+            counters.update(counters.deltas([name], 1))
+        shards = counters.CounterShard.query().fetch()
+        self.assertTrue(len(shards) > 1)
+        self.assertEqual(counters.get_counts([name]), {name: 50})
+
+    def testGETStatsNotExistentAuthor(self):
+        response = self.app.get('/stats/author/nobody@foo.com')
+        self.assertEqual(response.status_code, 404)
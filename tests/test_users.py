@@ -8,7 +8,8 @@ from google.appengine.ext import ndb
 from google.appengine.ext import testbed
 
 from app import app
-from tests.utils import BaseTestClass, build_auth_headers
+from app.auth import revoke_tokens
+from tests.utils import BaseTestClass, build_auth_headers, build_token_headers
 
 
 class UserEndpointTest(BaseTestClass):
@@ -22,6 +23,16 @@ class UserEndpointTest(BaseTestClass):
         content = json.loads(response.data)
         self.assertEqual(content, {'created': 'foo@bar.com'})
 
+    def testUserCreatedWithOneLookup(self):
+        user_info = {'id': 'foo@bar.com', 'nick': 'foo',
+                     'name': 'Foo', 'lastName': 'bar', 'password': 'foobar'}
+        self.rpcs.reset()
+        response = self.app.post(
+            '/user', data=json.dumps(user_info), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rpcs.count('Get'), 1)
+        self.assertEqual(self.rpcs.count('Put'), 1)
+
     def testUserNotValidNotEnoughData(self):
         user_info = {'id': 'bar@foo.com', 'nick': 'foobar'}
         response = self.app.post(
@@ -56,6 +67,28 @@ class UserEndpointTest(BaseTestClass):
                              'nick': 'foo', 'name': 'Foo', 'lastName': 'bar'}]
         self.assertEqual(content, expected_content)
 
+    def testGetAllPaginated(self):
+        for i in range(5):
+            user_info = {'id': 'foo{}@bar.com'.format(i), 'nick': 'foo',
+                         'name': 'Foo', 'lastName': 'bar', 'password': 'foobar'}
+            self.app.post('/user', data=json.dumps(user_info),
+                          content_type='application/json')
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            response = self.app.get('/user?limit=2&cursor={}'.format(cursor))
+            self.assertEqual(response.status_code, 200)
+            content = json.loads(response.data)
+            self.assertTrue(len(content) <= 2)
+            ids.extend(user['id'] for user in content)
+            cursor = response.headers.get('X-Next-Cursor')
+        self.assertEqual(sorted(ids),
+                         ['foo{}@bar.com'.format(i) for i in range(5)])
+
+    def testGetAllInvalidCursor(self):
+        response = self.app.get('/user?cursor=foo')
+        self.assertEqual(response.status_code, 400)
+
     def testGetAllEmptyTable(self):
         response = self.app.get('/user')
         content = json.loads(response.data)
@@ -97,6 +130,79 @@ class UserAuthenticationTest(BaseTestClass):
                                 content_type='application/json')
         self.assertEqual(response.status_code, 401)
 
+    def testPOSTRequestReusesVerifiedCredentials(self):
+        auth_headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        organism = {'name': 'FOO',
+                    'address': 'Foo Bar Street',
+                    'country': 'Spain'}
+        self.app.post('/organisms',
+                      data=json.dumps(organism),
+                      headers=auth_headers,
+                      content_type='application/json')
+        self.rpcs.reset()
+        response = self.app.post('/organisms',
+                                 data=json.dumps(organism),
+                                 headers=auth_headers,
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rpcs.count('Get'), 0)
+
+
+class UserTokenTest(BaseTestClass):
+
+    def setUp(self):
+        super(UserTokenTest, self).setUp()
+        self.user_info = {'id': 'foo@bar.com', 'nick': 'foo',
+                          'name': 'Foo', 'lastName': 'bar', 'password': 'foobar'}
+        self.app.post('/user', data=json.dumps(self.user_info),
+                      content_type='application/json')
+        credentials = {'id': self.user_info['id'],
+                       'password': self.user_info['password']}
+        response = self.app.post('/user/check',
+                                 data=json.dumps(credentials),
+                                 content_type='application/json')
+        self.token = json.loads(response.data)['token']
+
+    def testTokenAuthenticatesWithoutDatastore(self):
+        organism = {'name': 'FOO',
+                    'address': 'Foo Bar Street',
+                    'country': 'Spain'}
+        self.rpcs.reset()
+        response = self.app.post('/organisms',
+                                 data=json.dumps(organism),
+                                 headers=build_token_headers(self.token),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rpcs.count('Get'), 0)
+
+    def testCheckRejectsNonStringCredentials(self):
+        for credentials in ({'id': 5, 'password': 'foobar'},
+                            {'id': self.user_info['id'], 'password': 5}):
+            response = self.app.post('/user/check',
+                                     data=json.dumps(credentials),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+    def testInvalidTokenRejected(self):
+        response = self.app.delete('/user/{}'.format(quote_plus('foo@bar.com')),
+                                   headers=build_token_headers('foo'))
+        self.assertEqual(response.status_code, 401)
+
+    def testTokenRevokedWhenUserUpdated(self):
+        quoted_url = quote_plus(self.user_info['id'])
+        headers = build_token_headers(self.token)
+        response = self.app.put('/user/{}'.format(quoted_url),
+                                headers=headers,
+                                data=json.dumps(self.user_info),
+                                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.app.put('/user/{}'.format(quoted_url),
+                                headers=headers,
+                                data=json.dumps(self.user_info),
+                                content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
 
 class UserEndpointGETTest(BaseTestClass):
 
@@ -146,6 +252,18 @@ class UserEndpointPUTAndPOSTTest(BaseTestClass):
         result = json.loads(response.data)
         self.assertEqual(result, expected_result)
 
+    def testPUTRequestLoadsUserOnce(self):
+        quoted_url = quote_plus(self.user_info['id'])
+        auth_headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.rpcs.reset()
+        response = self.app.put('/user/{}'.format(quoted_url),
+                                headers=auth_headers,
+                                data=json.dumps(self.user_info),
+                                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rpcs.count('Get'), 1)
+
     def testPUTRequestFailingNotEnoughData(self):
         quoted_url = quote_plus(self.user_info['id'])
         auth_headers = build_auth_headers(
@@ -194,6 +312,31 @@ class UserEndpointDELETETest(BaseTestClass):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(result, expected_result)
 
+    def testDELETERequestForgetsCredentials(self):
+        quoted_url = quote_plus(self.user_info['id'])
+        auth_headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        self.app.delete('/user/{}'.format(quoted_url), headers=auth_headers)
+        response = self.app.delete(
+            '/user/{}'.format(quoted_url), headers=auth_headers)
+        self.assertEqual(response.status_code, 401)
+
+    def testDELETEOnAnotherInstanceInvalidatesCredentials(self):
+        quoted_url = quote_plus(self.user_info['id'])
+        auth_headers = build_auth_headers(
+            self.user_info['id'], self.user_info['password'])
+        response = self.app.get('/_cache/stats', headers=auth_headers)
+        self.assertEqual(response.status_code, 200)
+
+        # Another instance deletes the user: only the datastore and memcache
+        # change, this instance's credential cache is left untouched.
+        ndb.Key('User', self.user_info['id']).delete()
+        revoke_tokens(self.user_info['id'])
+
+        response = self.app.delete(
+            '/user/{}'.format(quoted_url), headers=auth_headers)
+        self.assertEqual(response.status_code, 401)
+
     def testDELETERequestFailRemoveDifferentUser(self):
         auth_headers = build_auth_headers(
             self.user_info['id'], self.user_info['password'])
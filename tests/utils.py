@@ -1,11 +1,15 @@
 import unittest
 from base64 import b64encode
 
+from google.appengine.api import apiproxy_stub_map
 from google.appengine.api import memcache
+from google.appengine.ext import deferred
 from google.appengine.ext import ndb
 from google.appengine.ext import testbed
 
 from app import app
+from app.auth import clear_credentials_cache
+from app.cache import clear_entity_caches
 
 def build_auth_headers(username, password):
     headers = {
@@ -13,6 +17,27 @@ def build_auth_headers(username, password):
     }
     return headers
 
+def build_token_headers(token):
+    return {'Authorization': 'Bearer ' + token}
+
+class RPCCounter(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def record(self, service, call, request, response):
+        self.calls.append(call)
+
+    def count(self, call=None):
+        if call is None:
+            return len(self.calls)
+        return self.calls.count(call)
+
+    def reset(self):
+        self.calls = []
+        ndb.get_context().clear_cache()
+        memcache.flush_all()
+
 class BaseTestClass(unittest.TestCase):
 
     def setUp(self):
@@ -20,10 +45,25 @@ class BaseTestClass(unittest.TestCase):
         self.testbed.activate()
         self.testbed.init_datastore_v3_stub()
         self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
+        self.testbed.init_search_stub()
+        app.config['SECRET_KEY'] = 'test-secret-key'
         self.app = app.test_client()
         ndb.get_context().clear_cache()
+        clear_credentials_cache()
+        clear_entity_caches()
+        self.rpcs = RPCCounter()
+        apiproxy_stub_map.apiproxy.GetPostCallHooks().Append(
+            'rpc_counter', self.rpcs.record, 'datastore_v3')
+
+    def run_deferred(self):
+        taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+        tasks = taskqueue.get_filtered_tasks()
+        while tasks:
+            taskqueue.FlushQueue('default')
+            for task in tasks:
+                deferred.run(task.payload)
+            tasks = taskqueue.get_filtered_tasks()
 
     def tearDown(self):
         self.testbed.deactivate()
-
-